@@ -2,6 +2,8 @@
 
 # LLM接入配置,目前使用的第三方转发的openai接口
 # 腾讯的DeepSeek接口暂时不支持函数调用,所以没用上
+# 可选的 MAX_CONCURRENCY 指定该接口允许的最大并发请求数, 默认为 16
+# 可选的 PROMPT_CACHE_KEY 指定是否随请求发送 prompt_cache_key, 默认只对 api.openai.com 发送
 API_INFO = {
     "OHMYGPT": {
         "KEY": "sk-*",
@@ -1,3 +1,24 @@
+import importlib
 
+__all__ = ['ChatModel', 'EmbeddingModel', 'ModelLogger', 'OpenAIClient']
 
+# 按需导入子模块 (PEP 562), 导入 testerx.agent 本身不会加载 openai 等较重的依赖
+_LAZY_ATTRS = {
+    'ChatModel': '.chat',
+    'EmbeddingModel': '.embedding',
+    'ModelLogger': '.logger',
+    'OpenAIClient': '.openai_client',
+}
 
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,60 +1,115 @@
-import json
-from openai import OpenAI
-from config import CHAT_MODEL, API_INFO
+import asyncio
+from dataclasses import dataclass, field
+from testerx.agent.event_loop import run_sync
 from testerx.agent.logger import ModelLogger
+from testerx.agent.openai_client import OpenAIClient
+from testerx.utils.json_codec import JSONDecodeError, loads
 from testerx.tools import ToolManager, CurlTool, SystemCommandTool, MemoryStorageTool, StepCompletionTool
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
 
-class OpenAIClient:
-    """封装 OpenAI API 调用"""
+@dataclass(slots=True)
+class LoggedToolCall:
+    """流式响应中组装完成的工具调用"""
+    id: Optional[str]
+    type: str
+    name: Optional[str]
+    arguments: str
 
-    def __init__(self, provider, model):
-        self.client = OpenAI(
-            base_url=API_INFO[provider]["BASE_URL"],
-            api_key=API_INFO[provider]["KEY"]
-        )
-        self.model = model
-
-    def create_chat_completion(self, messages, tools=None, temperature=0, stream=False, max_tokens=None):
-        params = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": temperature,
-            "stream": stream
-        }
-        if tools:
-            params["tools"] = tools
-        if max_tokens:
-            params["max_tokens"] = max_tokens
-        return self.client.chat.completions.create(**params)
+    def to_message(self) -> Dict[str, Any]:
+        """转换为 OpenAI 消息格式的工具调用"""
+        return {"id": self.id, "type": self.type, "function": {"name": self.name, "arguments": self.arguments}}
+
+
+@dataclass(slots=True)
+class LoggedMessage:
+    role: str
+    content: Optional[str]
+    tool_calls: Optional[List[LoggedToolCall]]
+
+
+@dataclass(slots=True)
+class LoggedChoice:
+    index: int
+    message: LoggedMessage
+    finish_reason: Optional[str]
+
+
+@dataclass(slots=True)
+class LoggedResponse:
+    """流式响应组装后的完整响应, 字段结构与非流式响应一致, 可直接交给日志序列化"""
+    id: Optional[str] = None
+    object: str = "chat.completion"
+    created: Optional[int] = None
+    model: Optional[str] = None
+    choices: List[LoggedChoice] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class _ToolCallState:
+    """流式接收中的工具调用状态, 参数片段以 UTF-8 bytes 追加到 bytearray 中"""
+    id: Optional[str] = None
+    type: str = "function"
+    name: Optional[str] = None
+    arguments: bytearray = field(default_factory=bytearray)
+    scheduled: bool = False
+
+    def build(self) -> LoggedToolCall:
+        return LoggedToolCall(self.id, self.type, self.name, self.arguments.decode())
+
+    def parse_arguments(self) -> Any:
+        """参数接收完整后只解析一次; 无法解析时返回原始文本, 交由 ToolManager 报告解析失败"""
+        try:
+            return loads(self.arguments)
+        except JSONDecodeError:
+            return self.arguments.decode()
+
+
+@dataclass(slots=True)
+class _ChoiceState:
+    """流式接收中的单个选项状态"""
+    role: Optional[str] = None
+    content: List[str] = field(default_factory=list)
+    tool_calls: Dict[int, _ToolCallState] = field(default_factory=dict)
+    finish_reason: Optional[str] = None
 
 
 class ToolExecutor:
     """负责工具的执行和日志记录"""
 
-    def __init__(self, tool_manager, logger):
+    def __init__(self, tool_manager, logger, max_concurrency: int = 8):
         self.tool_manager = tool_manager
         self.logger = logger
+        # 限制同时执行的工具数量, 避免并发请求超出服务方的速率限制
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def execute_tool(self, tool_call: LoggedToolCall, arguments: Any = None):
+        """
+        执行工具调用
 
-    def execute_tool(self, tool_call):
+        Args:
+            tool_call: 工具调用
+            arguments: 已解析的参数, 为 None 时由 ToolManager 解析 tool_call.arguments
+        """
         self._log_tool_call(tool_call)
-        result = self.tool_manager.execute_tool(
-            tool_call["function"]["name"],
-            tool_call["function"]["arguments"]
-        )
-        self._log_tool_result(tool_call["function"]["name"], result)
+        # 子进程和网络工具使用原生异步实现, 其余同步工具在线程池中执行, 多个工具调用可以并发进行
+        async with self._semaphore:
+            result, output = await self.tool_manager.aexecute_tool_serialized(
+                tool_call.name,
+                tool_call.arguments if arguments is None else arguments
+            )
+        self._log_tool_result(tool_call.name, result)
         return {
-            "tool_call_id": tool_call["id"],
-            "output": json.dumps(result) if not isinstance(result, str) else result
+            "tool_call_id": tool_call.id,
+            "output": output
         }
 
-    def _log_tool_call(self, tool_call):
+    def _log_tool_call(self, tool_call: LoggedToolCall):
         self.logger.log(
             "tool_call", {
-                "tool_name": tool_call["function"]["name"],
-                "arguments": tool_call["function"]["arguments"]
+                "tool_name": tool_call.name,
+                "arguments": tool_call.arguments
             }
         )
 
@@ -69,12 +124,14 @@ class ToolExecutor:
 
 class ChatModel:
     def __init__(self):
+        from config import CHAT_MODEL
+
         self.provider = CHAT_MODEL["provider"]
         self.model = CHAT_MODEL["model"]
         self.format = CHAT_MODEL["format"]
         self.logger = ModelLogger(log_file="res/model_operations.log")
         self.tool_manager = ToolManager()
-        self.openai_client = OpenAIClient(self.provider, self.model)
+        self.openai_client = OpenAIClient(self.provider, self.model, self.format)
         self.tool_executor = ToolExecutor(self.tool_manager, self.logger)
         self._init_default_tools()
 
@@ -99,44 +156,184 @@ class ChatModel:
         return self.tool_manager.register_function(func, name=name, description=description)
 
     def chat(self, messages: List[Dict[str, str]], tools_to_use: Optional[List[str]] = None,
-             stream=False, temperature=0, max_tokens=None) -> Any:
-        """使用聊天模型生成响应"""
+             stream=False, temperature=0, max_tokens=None, n=1) -> Any:
+        """
+        使用聊天模型生成响应 (同步接口, 内部在常驻事件循环中执行 achat)
+
+        messages 会作为会话缓冲区被原地追加本轮产生的消息, 详见 achat。
+        """
+        return run_sync(self.achat(messages, tools_to_use, stream, temperature, max_tokens, n))
+
+    async def achat(self, messages: List[Dict[str, str]], tools_to_use: Optional[List[str]] = None,
+                    stream=False, temperature=0, max_tokens=None, n=1) -> Any:
+        """
+        使用聊天模型生成响应 (异步接口)
+
+        首轮请求始终以流式方式发送, 每个工具调用的参数一旦接收完整就立即开始执行,
+        无需等待整个响应生成结束; stream 参数仅为兼容旧接口而保留。
+
+        messages 是只追加的会话缓冲区: 本轮产生的 assistant 工具调用消息、tool 结果消息
+        以及最终的 assistant 回复都会被原地追加到其中, 不再每轮复制整个消息列表;
+        如需保持调用方的列表不变, 请传入 messages[:]。请求失败时追加的消息会被回滚。
+
+        n > 1 时在一次请求中生成 n 个候选回复并返回 List[str], 而不是循环发送 n 次相同请求;
+        此时不携带工具定义, 也不会向 messages 追加任何消息。
+        """
         self._log_request(messages, tools_to_use, temperature, max_tokens)
-        tool_definitions = self.tool_manager.get_tool_definitions(tools_to_use) if tools_to_use else None
-        response = self.openai_client.create_chat_completion(
-            messages, tool_definitions, temperature, stream, max_tokens
+        tool_definitions = self.tool_manager.get_tool_definitions(tools_to_use) if tools_to_use and n == 1 else None
+        response_stream = await self.openai_client.create_chat_completion(
+            messages, tool_definitions, temperature, True, max_tokens, n
         )
-        response_dict = self._log_response(response)
-
-        if response_dict["choices"][0]["message"]["tool_calls"]:
-            tool_calls = response_dict["choices"][0]["message"]["tool_calls"]
-            tool_results = [self.tool_executor.execute_tool(tool_call) for tool_call in tool_calls]
-            final_response = self._handle_tool_results(messages, tool_calls, tool_results, temperature, max_tokens)
-            return final_response["choices"][0]["message"]["content"]
-        return response_dict["choices"][0]["message"]["content"]
-
-    def _handle_tool_results(self, messages, tool_calls, tool_results, temperature, max_tokens):
-        """处理工具结果并生成最终响应"""
-        updated_messages = messages.copy()
-        updated_messages.append(
+        response, tool_tasks = await self._consume_stream(response_stream)
+        self._log_response(response)
+
+        if n > 1:
+            return [choice.message.content for choice in response.choices]
+
+        if response.choices[0].message.tool_calls:
+            final_response = await self._handle_tool_results(
+                messages, response.choices[0].message.tool_calls, tool_tasks, temperature, max_tokens
+            )
+            content = final_response["choices"][0]["message"].get("content")
+        else:
+            content = response.choices[0].message.content
+        messages.append({"role": "assistant", "content": content})
+        return content
+
+    async def _consume_stream(self, response_stream):
+        """
+        增量组装流式响应, 并在第一个选项的每个工具调用参数接收完整时立即调度执行
+
+        工具调用按 index 顺序输出, 出现新的 index 即说明上一个工具调用的参数已完整,
+        最后一个工具调用在收到 finish_reason 时调度。
+
+        Returns:
+            (response, tool_tasks) 元组, response 为 LoggedResponse, 结构与非流式响应的日志一致
+        """
+        response = LoggedResponse()
+        choices: Dict[int, _ChoiceState] = {}
+        tool_tasks = []
+        chunk_log = self.logger.log_batched("response_chunks")
+
+        def schedule(tool_call_state: _ToolCallState):
+            tool_tasks.append(
+                asyncio.create_task(
+                    self.tool_executor.execute_tool(tool_call_state.build(), tool_call_state.parse_arguments())
+                )
+            )
+            tool_call_state.scheduled = True
+
+        try:
+            async for chunk in response_stream:
+                response.id = response.id or chunk.id
+                response.created = response.created or chunk.created
+                response.model = response.model or chunk.model
+                for choice in chunk.choices:
+                    state = choices.get(choice.index)
+                    if state is None:
+                        state = choices[choice.index] = _ChoiceState()
+                    delta = choice.delta
+                    chunk_log.append(
+                        [
+                            choice.index, delta.content,
+                            [[tc.index, tc.function.arguments if tc.function else None] for tc in delta.tool_calls or []]
+                        ]
+                    )
+                    if delta.role:
+                        state.role = delta.role
+                    if delta.content:
+                        state.content.append(delta.content)
+                    for tool_call_delta in delta.tool_calls or []:
+                        tool_call_state = state.tool_calls.get(tool_call_delta.index)
+                        if tool_call_state is None:
+                            # 新的工具调用开始, 之前的工具调用参数已经完整
+                            if choice.index == 0:
+                                for pending in state.tool_calls.values():
+                                    if not pending.scheduled:
+                                        schedule(pending)
+                            tool_call_state = state.tool_calls[tool_call_delta.index] = _ToolCallState()
+                        if tool_call_delta.id:
+                            tool_call_state.id = tool_call_delta.id
+                        if tool_call_delta.type:
+                            tool_call_state.type = tool_call_delta.type
+                        if tool_call_delta.function:
+                            if tool_call_delta.function.name:
+                                tool_call_state.name = tool_call_delta.function.name
+                            if tool_call_delta.function.arguments:
+                                tool_call_state.arguments += tool_call_delta.function.arguments.encode()
+                    if choice.finish_reason:
+                        state.finish_reason = choice.finish_reason
+                        if choice.index == 0:
+                            for pending in state.tool_calls.values():
+                                if not pending.scheduled:
+                                    schedule(pending)
+            chunk_log.flush()
+
+            # 兜底: 流异常结束时未收到 finish_reason 的工具调用
+            if 0 in choices:
+                for pending in choices[0].tool_calls.values():
+                    if not pending.scheduled:
+                        schedule(pending)
+
+            for index in sorted(choices):
+                state = choices[index]
+                tool_calls = [state.tool_calls[i].build() for i in sorted(state.tool_calls)]
+                response.choices.append(
+                    LoggedChoice(
+                        index,
+                        LoggedMessage(
+                            state.role or "assistant",
+                            "".join(state.content) if state.content else None,
+                            tool_calls or None
+                        ),
+                        state.finish_reason
+                    )
+                )
+        except BaseException:
+            await self._cancel_tool_tasks(tool_tasks)
+            raise
+        return response, tool_tasks
+
+    async def _handle_tool_results(self, messages, tool_calls, tool_tasks, temperature, max_tokens):
+        """
+        等待已调度的工具调用完成, 将工具调用和结果原地追加到 messages 并生成最终响应
+
+        tool 消息按 tool_calls 的顺序预先占位, 每个工具完成时立即填入结果,
+        最后一个工具完成后即可直接发起后续请求, 不必再统一组装消息。
+        记录追加前的消息数量, 出错时截断回原来的长度, 而不是复制整个列表。
+        """
+        start = len(messages)
+        messages.append(
             {
                 "role": "assistant",
-                "tool_calls": tool_calls
+                "tool_calls": [tool_call.to_message() for tool_call in tool_calls]
             }
         )
-        for result in tool_results:
-            updated_messages.append(
-                {
-                    "role": "tool",
-                    "tool_call_id": result["tool_call_id"],
-                    "content": result["output"]
-                }
+        tool_messages = {}
+        for tool_call in tool_calls:
+            tool_message = {"role": "tool", "tool_call_id": tool_call.id, "content": None}
+            tool_messages[tool_call.id] = tool_message
+            messages.append(tool_message)
+        try:
+            for next_result in asyncio.as_completed(tool_tasks):
+                result = await next_result
+                tool_messages[result["tool_call_id"]]["content"] = result["output"]
+            final_response = await self.openai_client.create_chat_completion(
+                messages, temperature=temperature, max_tokens=max_tokens
             )
-        final_response = self.openai_client.create_chat_completion(
-            updated_messages, temperature=temperature, max_tokens=max_tokens
-        )
+        except BaseException:
+            await self._cancel_tool_tasks(tool_tasks)
+            del messages[start:]
+            raise
         return self._log_final_response(final_response)
 
+    @staticmethod
+    async def _cancel_tool_tasks(tool_tasks):
+        """取消尚未完成的工具调用并等待其结束, 避免本轮失败回滚后工具仍在后台执行或异常无人获取"""
+        for task in tool_tasks:
+            task.cancel()
+        await asyncio.gather(*tool_tasks, return_exceptions=True)
+
     def _log_request(self, messages, tools_to_use, temperature, max_tokens):
         """记录请求日志"""
         self.logger.log(
@@ -148,54 +345,13 @@ class ChatModel:
             }
         )
 
-    def _log_response(self, response):
-        """记录响应日志"""
-        response_dict = {
-            "id": response.id,
-            "object": response.object,
-            "created": response.created,
-            "model": response.model,
-            "choices": [
-                {
-                    "index": choice.index,
-                    "message": {
-                        "role": choice.message.role,
-                        "content": choice.message.content,
-                        "tool_calls": [
-                            {
-                                "id": tool_call.id,
-                                "type": tool_call.type,
-                                "function": {
-                                    "name": tool_call.function.name,
-                                    "arguments": tool_call.function.arguments
-                                }
-                            } for tool_call in choice.message.tool_calls
-                        ] if choice.message.tool_calls else None
-                    },
-                    "finish_reason": choice.finish_reason
-                } for choice in response.choices
-            ]
-        }
-        self.logger.log("response", {"response": response_dict})
-        return response_dict
+    def _log_response(self, response: LoggedResponse):
+        """记录响应日志, LoggedResponse 由日志序列化直接展开, 不再另外构建字典"""
+        self.logger.log("response", {"response": response})
+        return response
 
     def _log_final_response(self, final_response):
-        """记录最终响应日志"""
-        final_response_dict = {
-            "id": final_response.id,
-            "object": final_response.object,
-            "created": final_response.created,
-            "model": final_response.model,
-            "choices": [
-                {
-                    "index": choice.index,
-                    "message": {
-                        "role": choice.message.role,
-                        "content": choice.message.content
-                    },
-                    "finish_reason": choice.finish_reason
-                } for choice in final_response.choices
-            ]
-        }
+        """记录最终响应日志, 直接使用 SDK 响应模型的 model_dump 生成字典"""
+        final_response_dict = final_response.model_dump(exclude_none=True)
         self.logger.log("final_response", {"response": final_response_dict})
         return final_response_dict
@@ -1,62 +1,142 @@
-from openai import OpenAI
-from config import API_INFO, EMBEDDING_MODEL
+import asyncio
+import base64
+import hashlib
+import numpy as np
+from testerx.agent.event_loop import run_sync
 from testerx.agent.logger import ModelLogger
-from typing import List
+from testerx.agent.openai_client import OpenAIClient
+from typing import Iterator, List, Optional, Tuple
 
 
-class OpenAIClient:
-    """封装 OpenAI API 调用"""
+class _EmbeddingMicroBatcher:
+    """
+    将并发提交的单条 embedding 请求合并为一次批量请求
 
-    def __init__(self, provider, model):
-        self.client = OpenAI(
-            base_url=API_INFO[provider]["BASE_URL"],
-            api_key=API_INFO[provider]["KEY"]
-        )
-        self.model = model
-
-    def create_chat_completion(self, messages, tools=None, temperature=0, stream=False, max_tokens=None):
-        params = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": temperature,
-            "stream": stream
-        }
-        if tools:
-            params["tools"] = tools
-        if max_tokens:
-            params["max_tokens"] = max_tokens
-        return self.client.chat.completions.create(**params)
-
-    def create_embedding(self, input_text, encoding_format="float"):
-        params = {
-            "model": self.model,
-            "input": input_text,
-            "encoding_format": encoding_format  # 可以根据需要选择 "float" 或 "base64"
-        }
-        return self.client.embeddings.create(**params)
+    没有进行中的批量请求时, 只等待事件循环的当前一轮 (同一轮中提交的请求, 如 asyncio.gather 的多个调用
+    合并为一批), 单独的调用不会额外等待; 已有批量请求进行中时, 新请求在 window 秒的时间窗口内合并。
+    """
+
+    def __init__(self, embedding_model: "EmbeddingModel", window: float = 0.02):
+        self.embedding_model = embedding_model
+        self.window = window
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._inflight = 0  # 进行中的批量请求数
+
+    async def submit(self, input_text: str) -> np.ndarray:
+        """提交一条文本, 等待所在批次的请求完成后返回其 embedding 向量"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((input_text, future))
+        if self._flush_task is None:
+            delay = self.window if self._inflight else 0
+            self._flush_task = loop.create_task(self._flush_later(delay))
+        return await future
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        pending, self._pending = self._pending, []
+        self._flush_task = None
+        self._inflight += 1
+        try:
+            embeddings = await self.embedding_model.aget_embeddings([text for text, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._inflight -= 1
+        for (_, future), embedding in zip(pending, embeddings):
+            if not future.done():
+                future.set_result(embedding)
 
 
 class EmbeddingModel:
-    def __init__(self):
+    # 单次请求最多包含的文本条数 (OpenAI embeddings 接口上限为 2048)
+    MAX_BATCH_SIZE = 2048
+    # 单次请求的总字符数上限, 用于近似控制请求的 token 总量
+    MAX_BATCH_CHARS = 200_000
+
+    def __init__(self, batch_window: float = 0.02):
+        """
+        Args:
+            batch_window: 已有批量请求进行中时, 合并后续并发单条请求的时间窗口 (秒)
+        """
+        from config import EMBEDDING_MODEL
+
         self.provider = EMBEDDING_MODEL["provider"]
         self.model = EMBEDDING_MODEL["model"]
         self.logger = ModelLogger(log_file="res/embedding_operations.log")
         self.openai_client = OpenAIClient(self.provider, self.model)
+        self._batcher = _EmbeddingMicroBatcher(self, window=batch_window)
+
+    def get_embedding(self, input_text: str) -> np.ndarray:
+        """
+        获取文本的 embedding 向量 (同步接口, 内部在常驻事件循环中执行 aget_embedding)
+
+        Args:
+            input_text: 输入文本
+
+        Returns:
+            文本的 embedding 向量 (float32 的 np.ndarray)
+        """
+        return run_sync(self.aget_embedding(input_text))
 
-    def get_embedding(self, input_text: str) -> List[float]:
+    async def aget_embedding(self, input_text: str) -> np.ndarray:
         """
-        获取文本的 embedding 向量
+        获取文本的 embedding 向量 (异步接口), 并发的调用会被合并为批量请求
 
         Args:
             input_text: 输入文本
 
         Returns:
-            文本的 embedding 向量 (List[float])
+            文本的 embedding 向量 (float32 的 np.ndarray)
         """
-        self._log_request(input_text)
-        response = self.openai_client.create_embedding(input_text)
-        embedding_vector = self._log_response(response)
-        return embedding_vector
+        return await self._batcher.submit(input_text)
+
+    def get_embeddings(self, input_texts: List[str]) -> List[np.ndarray]:
+        """
+        批量获取多条文本的 embedding 向量 (同步接口)
+
+        Args:
+            input_texts: 输入文本列表
+
+        Returns:
+            与输入顺序一致的 embedding 向量 (float32 的 np.ndarray) 列表
+        """
+        return run_sync(self.aget_embeddings(input_texts))
+
+    async def aget_embeddings(self, input_texts: List[str]) -> List[np.ndarray]:
+        """
+        批量获取多条文本的 embedding 向量 (异步接口), 按条数和字符数上限拆分为若干次请求
+
+        Args:
+            input_texts: 输入文本列表
+
+        Returns:
+            与输入顺序一致的 embedding 向量 (float32 的 np.ndarray) 列表
+        """
+        embeddings = []
+        for batch in self._split_batches(input_texts):
+            self._log_request(batch)
+            response = await self.openai_client.create_embedding(batch, encoding_format="base64")
+            embeddings.extend(self._log_response(response))
+        return embeddings
+
+    def _split_batches(self, input_texts: List[str]) -> Iterator[List[str]]:
+        """按单次请求的条数和字符数上限拆分文本列表"""
+        batch = []
+        batch_chars = 0
+        for text in input_texts:
+            if batch and (len(batch) >= self.MAX_BATCH_SIZE or batch_chars + len(text) > self.MAX_BATCH_CHARS):
+                yield batch
+                batch = []
+                batch_chars = 0
+            batch.append(text)
+            batch_chars += len(text)
+        if batch:
+            yield batch
 
     def _log_request(self, input_text):
         """记录 embedding 请求日志"""
@@ -67,15 +147,33 @@ class EmbeddingModel:
             }
         )
 
+    @staticmethod
+    def _decode_embedding(embedding) -> np.ndarray:
+        """将响应中的 embedding (base64 字符串或浮点数列表) 转换为 float32 数组"""
+        if isinstance(embedding, list):
+            return np.asarray(embedding, dtype=np.float32)
+        return np.frombuffer(base64.b64decode(embedding), dtype="<f4")
+
     def _log_response(self, response):
-        """记录 embedding 响应日志, 并提取 embedding 向量"""
+        """
+        记录 embedding 响应日志, 并按输入顺序解码 embedding 向量
+
+        请求时指定了 base64 编码, 向量为小端 float32 数据, 直接用 NumPy 解码;
+        忽略 encoding_format 的服务方返回浮点数列表, 直接转换为 float32 数组。
+        日志中只记录向量的维度和摘要, 避免把完整向量重新展开成文本。
+        """
+        embeddings = [
+            self._decode_embedding(data.embedding)
+            for data in sorted(response.data, key=lambda d: d.index)
+        ]
         response_dict = {
             "object": response.object,
             "data": [
                 {
-                    "index": data.index,
-                    "embedding": data.embedding
-                } for data in response.data
+                    "index": index,
+                    "shape": list(embedding.shape),
+                    "digest": hashlib.blake2b(embedding.tobytes(), digest_size=8).hexdigest()
+                } for index, embedding in enumerate(embeddings)
             ],
             "model": response.model,
             "usage": {
@@ -84,7 +182,7 @@ class EmbeddingModel:
             }
         }
         self.logger.log("embedding_response", {"response": response_dict})
-        return response_dict["data"][0]["embedding"]
+        return embeddings
 
 
 if __name__ == '__main__':
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    获取在后台守护线程中常驻运行的事件循环
+
+    AsyncOpenAI 内部的连接池绑定在创建它的事件循环上, 每次 asyncio.run 都会新建并关闭事件循环,
+    导致连接无法复用, 因此所有同步调用都统一提交到这个常驻事件循环中执行。
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="testerx-event-loop", daemon=True)
+            thread.start()
+            _loop = loop
+    return _loop
+
+
+def run_sync(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    在常驻事件循环中执行协程并阻塞等待结果, 供同步调用方使用
+
+    Args:
+        coro: 要执行的协程
+
+    Returns:
+        协程的返回值
+    """
+    loop = get_event_loop()
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        raise RuntimeError("不能在事件循环线程内调用同步接口，请直接 await 对应的异步方法")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
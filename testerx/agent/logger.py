@@ -1,6 +1,128 @@
-from datetime import datetime
 from typing import Dict, List, Callable, Any, Optional, Union
-import json
+import atexit
+import dataclasses
+import os
+import queue
+import threading
+import time
+from testerx.utils.json_codec import dumps
+from testerx.utils.time_utils import iso_now
+
+# 通知写日志线程退出的哨兵
+_CLOSE = object()
+
+
+def _log_default(obj: Any) -> Any:
+    """
+    日志序列化时处理 JSON 无法直接表示的对象, 保证记录日志不会因工具结果的类型而失败
+
+    bytes 按 UTF-8 解码 (无法解码的字节替换为 U+FFFD), 数组转换为列表, 其余对象记录为 str(obj)。
+    """
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).decode("utf-8", errors="replace")
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    return str(obj)
+
+
+class _LogFileWriter:
+    """
+    单个日志文件的后台写入线程, 同一路径的所有 ModelLogger 共享一个实例
+
+    只有一个线程持有文件句柄顺序写入, 多个记录器写同一文件时各行不会交错或被截断。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # 已停止 (进程退出阶段) 或写入线程异常退出后, 改为直接追加写入文件
+        self._stopped = False
+        atexit.register(self.close)
+
+    def write(self, line: bytes):
+        """
+        写入一行
+
+        首次写入时在调用方线程打开文件, 打开失败的异常直接抛给调用方, 打开成功后把句柄交给后台线程。
+        """
+        with self._lock:
+            if not self._stopped:
+                if self._thread is None:
+                    f = open(self.path, "ab", buffering=1 << 16)
+                    self._thread = threading.Thread(target=self._run, args=(f,),
+                                                    name="model-logger-writer", daemon=True)
+                    self._thread.start()
+                self._queue.put_nowait(line)
+                return
+        with open(self.path, "ab") as f:
+            f.write(line)
+
+    def _run(self, f):
+        """保持文件句柄打开, 队列排空时再刷新缓冲区"""
+        try:
+            with f:
+                while True:
+                    line = self._queue.get()
+                    try:
+                        if line is _CLOSE:
+                            return
+                        f.write(line)
+                        if self._queue.empty():
+                            f.flush()
+                    finally:
+                        self._queue.task_done()
+        except Exception:
+            # 线程异常退出: 之后的写入改为直接追加, 并排空队列, 保证 flush() 不会永久阻塞
+            with self._lock:
+                self._stopped = True
+            while True:
+                try:
+                    line = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    if line is not _CLOSE:
+                        with open(self.path, "ab") as retry:
+                            retry.write(line)
+                except OSError:
+                    pass
+                finally:
+                    self._queue.task_done()
+            raise
+
+    def flush(self):
+        """阻塞直到已入队的日志全部写入文件"""
+        self._queue.join()
+
+    def close(self):
+        """写完剩余日志并停止后台线程"""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put_nowait(_CLOSE)
+        thread.join()
+
+
+_writers: Dict[str, _LogFileWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def _get_writer(log_file: str) -> _LogFileWriter:
+    """返回日志文件对应的共享写入线程, 按绝对路径区分文件"""
+    path = os.path.abspath(log_file)
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = _LogFileWriter(path)
+        return writer
 
 
 class ModelLogger:
@@ -9,20 +131,45 @@ class ModelLogger:
     def __init__(self, log_file: Optional[str] = None):
         self.log_file = log_file
         self.logs = []
+        # 日志文件由共享的后台线程写入, 调用方只负责序列化并入队
+        self._writer = _get_writer(log_file) if log_file else None
 
     def log(self, action: str, data: dict):
         """记录一个操作"""
         log_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": iso_now(),
             "action": action,
             "data": data
         }
         self.logs.append(log_entry)
 
-        # 如果指定了日志文件，则将日志写入文件
-        if self.log_file:
-            with open(self.log_file, "a") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+        # 如果指定了日志文件，则交给后台线程写入文件 (在调用方线程序列化, 便于定位序列化错误)
+        if self._writer is not None:
+            self._writer.write(dumps(log_entry, default=_log_default) + b"\n")
+
+    def flush(self):
+        """阻塞直到已记录的日志全部写入文件"""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self):
+        """
+        写完已记录的日志
+
+        写入线程由同一文件的所有记录器共享, 在进程退出时停止, 因此这里不停止线程。
+        """
+        self.flush()
+
+    def log_batched(self, action: str, flush_every: float = 0.2, max_items: int = 256) -> "BatchedLogBuffer":
+        """
+        创建一个批量日志缓冲区, 用于流式响应等高频场景
+
+        Args:
+            action: 日志操作名称
+            flush_every: 距上次写入超过该秒数时写入一次
+            max_items: 缓冲条目数达到该值时写入一次
+        """
+        return BatchedLogBuffer(self, action, flush_every, max_items)
 
     def get_logs(self) -> List[dict]:
         """获取所有日志"""
@@ -31,3 +178,28 @@ class ModelLogger:
     def clear_logs(self):
         """清空日志"""
         self.logs = []
+
+
+class BatchedLogBuffer:
+    """批量日志缓冲区, 将高频的小条目合并为一条日志写入, 减少序列化和写文件的次数"""
+
+    def __init__(self, logger: ModelLogger, action: str, flush_every: float = 0.2, max_items: int = 256):
+        self.logger = logger
+        self.action = action
+        self.flush_every = flush_every
+        self.max_items = max_items
+        self._items = []
+        self._last_flush = time.monotonic()
+
+    def append(self, item: Any):
+        """追加一个条目, 达到时间或数量阈值时写入日志"""
+        self._items.append(item)
+        if len(self._items) >= self.max_items or time.monotonic() - self._last_flush >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """将缓冲的条目作为一条日志写入"""
+        if self._items:
+            self.logger.log(self.action, {"items": self._items})
+            self._items = []
+        self._last_flush = time.monotonic()
@@ -0,0 +1,263 @@
+import asyncio
+import functools
+import hashlib
+import importlib.util
+import random
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple, Type, Union
+from urllib.parse import urlsplit
+from testerx.utils.json_codec import dumps
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# httpx 的 HTTP/2 支持依赖可选的 h2 包, 未安装时退回 HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# 每个服务方默认允许的最大并发请求数, 可在 API_INFO 中通过 MAX_CONCURRENCY 覆盖
+DEFAULT_MAX_CONCURRENCY = 16
+# 请求失败后的最大重试次数及退避时间上限 (秒)
+MAX_RETRIES = 5
+MAX_BACKOFF = 30.0
+# 相同请求的结果在完成后继续复用的时间 (秒)
+COALESCE_TTL = 1.0
+
+
+class _LoopState:
+    """
+    绑定在单个事件循环上的共享对象
+
+    AsyncOpenAI 的连接池、信号量和进行中的任务都只能在创建它们的事件循环中使用。
+    同步接口统一在常驻事件循环中执行, 调用方在自己的事件循环 (如 asyncio.run) 中直接 await 异步接口时,
+    使用该事件循环各自的一份, 事件循环被回收后随之释放。
+    同一事件循环内的访问都在其所在线程中进行, 因此无需加锁。
+    """
+
+    def __init__(self):
+        self.clients: Dict[Tuple[str, str], "AsyncOpenAI"] = {}
+        self.semaphores: Dict[Tuple[str, int], asyncio.Semaphore] = {}
+        # 合并相同请求: 请求摘要 -> 进行中的请求任务 / (过期时间, 最近完成的结果)
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.recent: Dict[str, Tuple[float, Any]] = {}
+
+
+_loop_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+_loop_states_lock = threading.Lock()
+
+
+def _loop_state() -> _LoopState:
+    """返回当前运行中的事件循环对应的共享对象"""
+    loop = asyncio.get_running_loop()
+    with _loop_states_lock:
+        state = _loop_states.get(loop)
+        if state is None:
+            state = _loop_states[loop] = _LoopState()
+    return state
+
+
+@functools.lru_cache(maxsize=None)
+def _retryable_errors() -> Tuple[Type[Exception], ...]:
+    """需要退避重试的 SDK 异常类型: 限流、连接错误和服务端错误"""
+    from openai import APIConnectionError, InternalServerError, RateLimitError
+    return RateLimitError, APIConnectionError, InternalServerError
+
+
+def _get_client(base_url: str, api_key: str) -> "AsyncOpenAI":
+    """
+    在当前事件循环中按 (base_url, api_key) 缓存 AsyncOpenAI 客户端
+
+    同一事件循环中的所有 ChatModel/EmbeddingModel 实例共享同一个客户端及其 HTTP 连接池,
+    避免每次创建模型时都重新进行 DNS 解析和 TCP/TLS 握手。
+    安装了 h2 时启用 HTTP/2, 并发的工具调用请求可以复用同一条连接。
+    重试由 OpenAIClient 统一处理, 因此关闭 SDK 自带的重试。
+    openai 和 httpx 在第一次创建客户端时才导入, 只使用日志等模块的脚本不必承担其导入开销。
+    """
+    clients = _loop_state().clients
+    client = clients.get((base_url, api_key))
+    if client is None:
+        client = clients[(base_url, api_key)] = _create_client(base_url, api_key)
+    return client
+
+
+def _create_client(base_url: str, api_key: str) -> "AsyncOpenAI":
+    """创建 AsyncOpenAI 客户端"""
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    limits = httpx.Limits(max_connections=200, max_keepalive_connections=200)
+    return AsyncOpenAI(
+        base_url=base_url,
+        api_key=api_key,
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(
+            http2=HTTP2_AVAILABLE,
+            limits=limits,
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            transport=httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE, limits=limits, retries=2)
+        )
+    )
+
+
+def _get_semaphore(base_url: str, max_concurrency: int) -> asyncio.Semaphore:
+    """在当前事件循环中按服务方缓存并发信号量, 同一服务方的所有请求共享并发上限"""
+    semaphores = _loop_state().semaphores
+    semaphore = semaphores.get((base_url, max_concurrency))
+    if semaphore is None:
+        semaphore = semaphores[(base_url, max_concurrency)] = asyncio.Semaphore(max_concurrency)
+    return semaphore
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """
+    计算下一次重试前的等待时间
+
+    优先使用服务方在 retry-after 响应头中给出的等待时间, 否则使用带随机抖动的指数退避。
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after", "")), MAX_BACKOFF)
+        except ValueError:
+            pass
+    return random.uniform(0, min(MAX_BACKOFF, 2 ** attempt))
+
+
+@functools.lru_cache(maxsize=64)
+def _prompt_cache_key(system_prompt: str) -> str:
+    """根据系统提示词计算 prompt_cache_key, 相同的系统提示词只计算一次摘要"""
+    return hashlib.sha256(system_prompt.encode()).hexdigest()
+
+
+class OpenAIClient:
+    """封装 OpenAI API 调用"""
+
+    def __init__(self, provider, model, format="openai"):
+        from config import API_INFO
+
+        api_info = API_INFO[provider]
+        self.base_url = api_info["BASE_URL"]
+        self._api_key = api_info["KEY"]
+        self._max_concurrency = api_info.get("MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+        self.model = model
+        self.format = format.lower()
+        # prompt_cache_key 是 OpenAI 官方接口的参数, 第三方兼容接口可能拒绝未知字段, 需在 API_INFO 中显式开启
+        self._send_prompt_cache_key = api_info.get(
+            "PROMPT_CACHE_KEY", urlsplit(api_info["BASE_URL"]).hostname == "api.openai.com"
+        )
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        """当前事件循环中共享的 AsyncOpenAI 客户端, 只能在事件循环中访问"""
+        return _get_client(self.base_url, self._api_key)
+
+    @property
+    def _semaphore(self) -> asyncio.Semaphore:
+        """当前事件循环中该服务方共享的并发信号量"""
+        return _get_semaphore(self.base_url, self._max_concurrency)
+
+    async def _request(self, create, params):
+        """
+        在服务方的并发上限内发送请求, 遇到限流、连接错误或服务端错误时退避重试
+
+        Args:
+            create: SDK 的请求方法, 如 client.chat.completions.create
+            params: 请求参数
+
+        Returns:
+            SDK 的响应对象
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with self._semaphore:
+                    return await create(**params)
+            except _retryable_errors() as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                await asyncio.sleep(_retry_delay(e, attempt))
+
+    async def _coalesced_request(self, create, params):
+        """
+        合并相同的请求: 参数完全相同的并发请求只发送一次, 所有调用方共享同一个响应对象
+
+        只用于结果确定的请求 (embedding 以及 temperature 为 0 的非流式对话),
+        请求完成后的 COALESCE_TTL 秒内到达的相同请求也直接复用结果。
+        调用方不应修改返回的响应对象。
+        """
+        key = hashlib.blake2b(
+            dumps([self.base_url, create.__qualname__, params], default=str), digest_size=16
+        ).hexdigest()
+        state = _loop_state()
+        now = time.monotonic()
+        recent = state.recent.get(key)
+        if recent is not None:
+            if recent[0] > now:
+                return recent[1]
+            del state.recent[key]
+
+        task = state.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request(create, params))
+            state.inflight[key] = task
+            task.add_done_callback(lambda t: self._on_coalesced_done(state, key, t))
+        # 某个调用方被取消时不能连带取消其他调用方共享的请求
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _on_coalesced_done(state, key, task):
+        state.inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        for stale_key in [k for k, (expires, _) in state.recent.items() if expires <= time.monotonic()]:
+            del state.recent[stale_key]
+        state.recent[key] = (time.monotonic() + COALESCE_TTL, task.result())
+
+    def _apply_prompt_cache(self, params):
+        """
+        为静态的系统提示词启用服务端提示词缓存
+
+        系统提示词需要位于 messages 的开头, 这样每次请求的前缀才能命中缓存:
+        openai 格式通过 prompt_cache_key 将相同前缀的请求路由到同一缓存 (仅 OpenAI 官方接口或
+        API_INFO 中 PROMPT_CACHE_KEY 为 True 的接口),
+        anthropic 格式在系统消息上标记 cache_control。
+        """
+        messages = params["messages"]
+        if not messages or messages[0].get("role") != "system" or not isinstance(messages[0].get("content"), str):
+            return
+        system_prompt = messages[0]["content"]
+        if self.format == "anthropic":
+            system_message = {
+                **messages[0],
+                "content": [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+            }
+            params["messages"] = [system_message, *messages[1:]]
+        elif self._send_prompt_cache_key:
+            params["extra_body"] = {"prompt_cache_key": _prompt_cache_key(system_prompt)}
+
+    async def create_chat_completion(self, messages, tools=None, temperature=0, stream=False, max_tokens=None, n=1):
+        params = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": stream
+        }
+        if n > 1:
+            # 一次请求生成多个候选, 服务端只需对共享的提示词做一次预填充
+            params["n"] = n
+        if tools:
+            params["tools"] = tools
+        if max_tokens:
+            params["max_tokens"] = max_tokens
+        self._apply_prompt_cache(params)
+        if not stream and temperature == 0 and n == 1:
+            return await self._coalesced_request(self.client.chat.completions.create, params)
+        return await self._request(self.client.chat.completions.create, params)
+
+    async def create_embedding(self, input_text: Union[str, List[str]], encoding_format="base64"):
+        params = {
+            "model": self.model,
+            "input": input_text,
+            "encoding_format": encoding_format  # 可以根据需要选择 "float" 或 "base64"
+        }
+        return await self._coalesced_request(self.client.embeddings.create, params)
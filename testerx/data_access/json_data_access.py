@@ -1,17 +1,56 @@
-import json
+import atexit
+import copy
+import functools
+import hashlib
+import math
 import os
 import uuid
 import datetime
 import numpy as np
-from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Set, Tuple
 import shutil
+import threading
+import weakref
 import faiss
 from testerx.agent.embedding import EmbeddingModel
+from testerx.utils.json_codec import JSONDecodeError, dumps, loads
+from testerx.utils.time_utils import iso_now
+
+# 仍存活的数据访问实例, 进程退出时统一持久化; 使用弱引用, 不延长实例的生命周期
+_instances: "weakref.WeakSet[JsonDataAccess]" = weakref.WeakSet()
+
+
+def _save_instances():
+    """进程退出时持久化所有存活实例的Faiss索引和标签"""
+    for instance in list(_instances):
+        instance.save_faiss_index()
+        instance.flush_tags()
+
+
+atexit.register(_save_instances)
 
 
 class JsonDataAccess:
     """基于JSON文件和Faiss的数据访问类，优化向量搜索，自动生成和使用 Embedding"""
 
+    # 软删除的向量占比超过该阈值时才重建Faiss索引
+    REBUILD_DELETED_RATIO = 0.2
+    # 内存中缓存的已解析记忆的最大数量
+    MEMORY_CACHE_SIZE = 8192
+    # 嵌入向量矩阵文件的初始行数, 容量不足时按倍数扩展
+    INITIAL_EMBEDDING_CAPACITY = 1024
+    # 向量数量达到该阈值时尝试改用 IVF 倒排索引, 向量数量翻倍后重新训练
+    IVF_THRESHOLD = 5000
+    # IVF 索引相对暴力检索的 recall@IVF_RECALL_K 低于该值时继续使用暴力检索
+    IVF_MIN_RECALL = 0.95
+    IVF_RECALL_K = 5
+    # 估算 recall 使用的查询向量数量
+    IVF_RECALL_SAMPLES = 256
+    # 启动时并行读取大量小文件的线程数, 读取主要受系统调用延迟限制
+    LOAD_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
     def __init__(self, data_dir: str = "res/memory_data", embedding_dimension: int = 1536):
         """
         初始化数据访问层，并加载Faiss索引, 初始化 EmbeddingModel
@@ -22,148 +61,707 @@ class JsonDataAccess:
         """
         self.data_dir = data_dir
         self.memories_dir = os.path.join(data_dir, "memories")
-        self.embeddings_dir = os.path.join(data_dir, "embeddings")
+        self.embeddings_dir = os.path.join(data_dir, "embeddings")  # 旧版本按记忆分别保存的 .npy 文件, 启动时迁移
+        self.embeddings_file = os.path.join(data_dir, "embeddings.f32")
+        self.embedding_rows_file = os.path.join(data_dir, "embedding_rows.jsonl")
+        self.emb_cache_dir = os.path.join(data_dir, "emb_cache")
+        self.memory_index_file = os.path.join(data_dir, "memory_index.jsonl")
         self.tags_file = os.path.join(data_dir, "tags.json")
+        self.faiss_index_file = os.path.join(data_dir, "faiss.index")
+        self.faiss_ids_file = os.path.join(data_dir, "faiss_ids.json")
         self.embedding_dimension = embedding_dimension
+        # 部分 Faiss 安装包默认只使用单线程检索
+        faiss.omp_set_num_threads(max(1, os.cpu_count() or 1))
+        self._shard_dirs: Set[str] = set()  # 已确认存在的分片子目录
         self._ensure_directories()
+        self._migrate_flat_to_sharded(self.memories_dir, '.json')
+        self._migrate_flat_to_sharded(self.emb_cache_dir, '.npy')
         self._load_tags()
 
+        # 已解析记忆的 LRU 缓存, 写入或删除记忆时失效
+        self._memory_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._memory_cache_lock = threading.Lock()
+
+        # 所有记忆的ID集合, 启动时扫描一次记忆目录, 之后随写入和删除维护
+        self._all_ids: Set[str] = self._scan_memory_ids()
+
+        # 二级索引: 按类型、标签、(API路径, 方法)、关联的API文档ID查找记忆ID, 避免逐个解析记忆文件
+        self._by_type: Dict[str, Set[str]] = defaultdict(set)
+        self._by_tag: Dict[str, Set[str]] = defaultdict(set)
+        self._api_by_path_method: Dict[Tuple[str, str], str] = {}
+        self._test_cases_by_api: Dict[str, Set[str]] = defaultdict(set)
+        self._index_entries: Dict[str, Tuple[Any, ...]] = {}  # 记忆ID -> 建立二级索引时使用的字段
+        self._build_secondary_indexes()
+
+        # 所有嵌入向量按行保存在一个内存映射的 float32 矩阵文件中
+        self._emb_lock = threading.Lock()
+        self._open_embedding_store()
+        # 记忆文件和嵌入向量的写入相互独立, 添加记忆时在线程池中并发执行
+        self._io_pool = ThreadPoolExecutor(max_workers=4)
+
         self.faiss_index = None
-        self.memory_ids_indexed = []  # 存储索引中memory_id的顺序
-        self._build_faiss_index()
+        self.memory_ids_indexed = []  # 存储索引中memory_id的顺序, 与Faiss索引中的行一一对应
+        self._id_to_row: Dict[str, int] = {}  # 有效记忆在索引中所在的行
+        self._deleted_rows: Set[int] = set()  # 已软删除 (删除或被更新替换) 的行
+        self._query_buffers = threading.local()  # 单条查询使用的线程私有查询向量缓冲区
+        self._trained_size = 0  # 上次尝试训练 IVF 索引时的向量数量, 未尝试过时为 0
+        if not self._load_faiss_index():
+            self._build_faiss_index()
+        # 进程退出时持久化索引和标签, 下次启动无需重新读取所有嵌入向量文件
+        _instances.add(self)
 
         # 初始化 EmbeddingModel
         self.embedding_model_client = EmbeddingModel()
+        # 进程内按内容摘要缓存最近使用的 embedding, 未命中时再查磁盘缓存
+        self._cached_embedding = functools.lru_cache(maxsize=4096)(self._load_or_create_embedding)
 
     def _ensure_directories(self):
         """确保所需的目录存在"""
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs(self.memories_dir, exist_ok=True)
-        os.makedirs(self.embeddings_dir, exist_ok=True)
-
-        # 初始化tags文件如果不存在
-        if not os.path.exists(self.tags_file):
-            with open(self.tags_file, 'w') as f:
-                json.dump([], f)
+        os.makedirs(self.emb_cache_dir, exist_ok=True)
 
     def _load_tags(self):
-        """加载所有标签"""
+        """加载所有标签, tags文件不存在时创建"""
+        self._tags_dirty = False
         try:
-            with open(self.tags_file, 'r') as f:
-                self.tags = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            self.tags = []
+            with open(self.tags_file, 'rb') as f:
+                self.tags: Set[str] = set(loads(f.read()))
+        except (JSONDecodeError, FileNotFoundError):
+            self.tags = set()
             self._save_tags()
 
     def _save_tags(self):
-        """保存标签列表"""
-        with open(self.tags_file, 'w') as f:
-            json.dump(self.tags, f)
+        """保存标签集合 (按名称排序的JSON数组)"""
+        with open(self.tags_file, 'wb') as f:
+            f.write(dumps(sorted(self.tags)))
+        self._tags_dirty = False
+
+    def flush_tags(self):
+        """将新增的标签写入tags文件, 批量添加结束时和进程退出时调用"""
+        if self._tags_dirty and os.path.isdir(self.data_dir):
+            self._save_tags()
 
     def _add_tags(self, tag_names: List[str]) -> List[str]:
         """
         添加标签，如果不存在则创建
 
+        新标签只标记为待写入, 由 flush_tags 统一写入tags文件。
+
         Returns:
             添加的标签名列表
         """
-        for tag_name in tag_names:
-            if tag_name not in self.tags:
-                self.tags.append(tag_name)
-        self._save_tags()
+        new_tags = [tag_name for tag_name in tag_names if tag_name not in self.tags]
+        if new_tags:
+            self.tags.update(new_tags)
+            self._tags_dirty = True
         return tag_names
 
-    def _get_memory_file_path(self, memory_id: str) -> str:
+    def _sharded_path(self, base_dir: str, key: str, suffix: str, create: bool = False) -> str:
+        """
+        获取按键的前两个字符分片存放的文件路径, 如 memories/ab/abcdef....json
+
+        避免单个目录中的文件过多导致目录操作变慢。
+
+        Args:
+            create: 是否确保分片子目录存在 (写入文件前使用)
+        """
+        shard_dir = os.path.join(base_dir, key[:2])
+        if create and shard_dir not in self._shard_dirs:
+            os.makedirs(shard_dir, exist_ok=True)
+            self._shard_dirs.add(shard_dir)
+        return os.path.join(shard_dir, key + suffix)
+
+    def _migrate_flat_to_sharded(self, base_dir: str, suffix: str):
+        """将旧版本直接存放在 base_dir 下的文件移动到对应的分片子目录中"""
+        with os.scandir(base_dir) as entries:
+            flat_files = [entry.name for entry in entries if entry.is_file() and entry.name.endswith(suffix)]
+        for name in flat_files:
+            os.replace(
+                os.path.join(base_dir, name),
+                self._sharded_path(base_dir, name[:-len(suffix)], suffix, create=True)
+            )
+
+    def _get_memory_file_path(self, memory_id: str, create: bool = False) -> str:
         """获取记忆JSON文件路径"""
-        return os.path.join(self.memories_dir, f"{memory_id}.json")
+        return self._sharded_path(self.memories_dir, memory_id, '.json', create)
+
+    def _get_emb_cache_path(self, key: str, create: bool = False) -> str:
+        """获取 embedding 磁盘缓存文件路径"""
+        return self._sharded_path(self.emb_cache_dir, key, '.npy', create)
+
+    # ========== 嵌入向量存储 ==========
+    def _open_embedding_store(self):
+        """
+        打开 (必要时创建) 嵌入向量矩阵文件, 并回放行号映射文件
 
-    def _get_embedding_file_path(self, memory_id: str) -> str:
-        """获取嵌入向量文件路径"""
-        return os.path.join(self.embeddings_dir, f"{memory_id}.npy")
+        embedding_rows.jsonl 中每行记录 [memory_id, 行号], 行号为 null 表示该记忆的向量已删除;
+        被删除或替换的行保留在矩阵中, 重建Faiss索引时统一压缩。
+        """
+        self._emb_rows: Dict[str, int] = {}  # 记忆ID -> 向量在矩阵中的行号
+        self._emb_count = 0  # 矩阵中已使用的行数
+        try:
+            with open(self.embedding_rows_file, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    memory_id, row = loads(line)
+                    if row is None:
+                        self._emb_rows.pop(memory_id, None)
+                    else:
+                        self._emb_rows[memory_id] = row
+                        self._emb_count = max(self._emb_count, row + 1)
+        except FileNotFoundError:
+            pass
+
+        self._emb_mm = self._map_embeddings(max(self.INITIAL_EMBEDDING_CAPACITY, self._emb_count))
+        self._migrate_npy_embeddings()
+
+    def _map_embeddings(self, capacity: int) -> np.memmap:
+        """以至少 capacity 行的容量内存映射嵌入向量矩阵文件"""
+        row_bytes = self.embedding_dimension * np.dtype(np.float32).itemsize
+        with open(self.embeddings_file, 'ab') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size < capacity * row_bytes:
+                f.truncate(capacity * row_bytes)
+            else:
+                capacity = size // row_bytes
+        return np.memmap(self.embeddings_file, dtype=np.float32, mode='r+', shape=(capacity, self.embedding_dimension))
+
+    def _migrate_npy_embeddings(self):
+        """将旧版本 embeddings 目录下按记忆分别保存的 .npy 文件迁移到矩阵文件中"""
+        try:
+            with os.scandir(self.embeddings_dir) as entries:
+                paths = {entry.name[:-4]: entry.path for entry in entries if entry.name.endswith('.npy')}
+        except FileNotFoundError:
+            return
+        pending = [memory_id for memory_id in paths if memory_id not in self._emb_rows]
+        if pending:
+            # 预分配矩阵, 并行读取的向量直接写入对应的行
+            embeddings = np.empty((len(pending), self.embedding_dimension), dtype=np.float32)
+
+            def load_row(row):
+                embeddings[row] = np.load(paths[pending[row]])
+
+            with ThreadPoolExecutor(max_workers=self.LOAD_WORKERS) as executor:
+                list(executor.map(load_row, range(len(pending))))
+            self._store_embeddings(pending, embeddings)
+        for path in paths.values():
+            os.remove(path)
+        os.rmdir(self.embeddings_dir)
+
+    def _store_embeddings(self, memory_ids: List[str], embeddings: np.ndarray):
+        """将一组嵌入向量追加写入矩阵文件, 并记录各记忆对应的行号"""
+        with self._emb_lock:
+            start = self._emb_count
+            end = start + len(memory_ids)
+            if end > self._emb_mm.shape[0]:
+                self._emb_mm.flush()
+                self._emb_mm = self._map_embeddings(max(end, 2 * self._emb_mm.shape[0]))
+            self._emb_mm[start:end] = embeddings
+            self._emb_mm.flush()
+            with open(self.embedding_rows_file, 'ab') as f:
+                f.write(b"".join(dumps([memory_id, start + i]) + b"\n" for i, memory_id in enumerate(memory_ids)))
+            for i, memory_id in enumerate(memory_ids):
+                self._emb_rows[memory_id] = start + i
+            self._emb_count = end
+
+    def _remove_embedding(self, memory_id: str) -> bool:
+        """删除记忆的嵌入向量 (只记录删除, 所在行在压缩时回收)"""
+        with self._emb_lock:
+            if self._emb_rows.pop(memory_id, None) is None:
+                return False
+            with open(self.embedding_rows_file, 'ab') as f:
+                f.write(dumps([memory_id, None]) + b"\n")
+            return True
+
+    def _compact_embeddings(self):
+        """将有效的嵌入向量按原有顺序移动到矩阵开头, 回收已删除或被替换的行"""
+        with self._emb_lock:
+            if self._emb_count == len(self._emb_rows):
+                return
+            live = sorted(self._emb_rows.items(), key=lambda item: item[1])
+            rows = np.fromiter((row for _, row in live), dtype=np.int64, count=len(live))
+            self._emb_mm[:len(live)] = self._emb_mm[rows]
+            self._emb_mm.flush()
+            self._emb_rows = {memory_id: row for row, (memory_id, _) in enumerate(live)}
+            self._emb_count = len(live)
+            tmp_file = self.embedding_rows_file + ".tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(b"".join(dumps([memory_id, row]) + b"\n" for memory_id, row in self._emb_rows.items()))
+            os.replace(tmp_file, self.embedding_rows_file)
+
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        """返回 L2 归一化后的 float32 矩阵副本, 归一化后的内积即余弦相似度"""
+        normalized = np.array(embeddings, dtype=np.float32, ndmin=2, order='C')
+        faiss.normalize_L2(normalized)
+        return normalized
 
     def _save_embedding(self, memory_id: str, embedding: np.ndarray):
-        """保存嵌入向量到文件, 并更新Faiss索引"""
-        np.save(self._get_embedding_file_path(memory_id), embedding)
+        """归一化并保存嵌入向量到矩阵文件, 并更新Faiss索引"""
+        embedding = self._normalize(embedding.reshape(1, -1))
+        self._store_embeddings([memory_id], embedding)
         self._update_faiss_index_single(memory_id, embedding)
 
     def _load_embedding(self, memory_id: str) -> Optional[np.ndarray]:
-        """从文件加载嵌入向量"""
-        path = self._get_embedding_file_path(memory_id)
-        if os.path.exists(path):
-            return np.load(path)
-        return None
+        """从矩阵文件加载嵌入向量"""
+        row = self._emb_rows.get(memory_id)
+        if row is None:
+            return None
+        return np.array(self._emb_mm[row])
+
+    def _embed(self, text: str) -> np.ndarray:
+        """
+        获取文本的 embedding 向量, 相同内容只请求一次 EmbeddingModel
+
+        以模型名和文本内容的 blake2b 摘要为键, 依次查找进程内 LRU 缓存和 emb_cache 目录下的磁盘缓存。
+
+        Returns:
+            只读的 float32 向量, 调用方需要修改时应先复制
+        """
+        key = hashlib.blake2b(
+            f"{self.embedding_model_client.model}\0{text}".encode(), digest_size=16
+        ).hexdigest()
+        return self._cached_embedding(key, text)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        批量获取多条文本的 embedding 向量, 缓存中没有的文本合并为一次 EmbeddingModel 批量请求
+
+        Returns:
+            形状为 (len(texts), embedding_dimension) 的 float32 矩阵
+        """
+        keys = [
+            hashlib.blake2b(f"{self.embedding_model_client.model}\0{text}".encode(), digest_size=16).hexdigest()
+            for text in texts
+        ]
+        # 进程内缓存中的向量一定已写入磁盘缓存, 因此只需检查磁盘缓存文件
+        missing = {
+            key: text for key, text in zip(keys, texts)
+            if not os.path.exists(self._get_emb_cache_path(key))
+        }
+        if missing:
+            embeddings = self.embedding_model_client.get_embeddings(list(missing.values()))
+            for key, embedding in zip(missing, embeddings):
+                np.save(self._get_emb_cache_path(key, create=True), np.asarray(embedding, dtype=np.float32))
+
+        result = np.empty((len(texts), self.embedding_dimension), dtype=np.float32)
+        for row, (key, text) in enumerate(zip(keys, texts)):
+            result[row] = self._cached_embedding(key, text)
+        return result
+
+    def _load_or_create_embedding(self, key: str, text: str) -> np.ndarray:
+        """从磁盘缓存加载 embedding, 未命中时调用 EmbeddingModel 并写入缓存"""
+        try:
+            embedding = np.load(self._get_emb_cache_path(key))
+        except (FileNotFoundError, ValueError):
+            embedding = np.array(self.embedding_model_client.get_embedding(text), dtype=np.float32)
+            np.save(self._get_emb_cache_path(key, create=True), embedding)
+        embedding.flags.writeable = False
+        return embedding
+
+    def _run_io(self, *calls: Tuple[Any, ...]):
+        """
+        在I/O线程池中并发执行多个相互独立的写入操作, 全部完成后返回
+
+        Args:
+            calls: (函数, 参数...) 元组, 任一操作抛出的异常会在调用方线程中重新抛出
+        """
+        futures = [self._io_pool.submit(*call) for call in calls]
+        for future in futures:
+            future.result()
 
     def _save_memory(self, memory_data: Dict[str, Any]):
         """保存记忆数据到JSON文件"""
-        file_path = self._get_memory_file_path(memory_data['id'])
-        with open(file_path, 'w') as f:
+        file_path = self._get_memory_file_path(memory_data['id'], create=True)
+        with open(file_path, 'wb') as f:
             # 深拷贝以避免修改原始数据
             data_to_save = memory_data.copy()
             # 移除embedding字段，因为它被Faiss索引管理
             if 'embedding' in data_to_save:
                 del data_to_save['embedding']
-            json.dump(data_to_save, f, indent=2)
+            f.write(dumps(data_to_save))
+        self._all_ids.add(memory_data['id'])
+        self._invalidate_cached_memory(memory_data['id'])
+        self._index_memory(memory_data)
 
     def _load_memory(self, memory_id: str) -> Optional[Dict[str, Any]]:
-        """从JSON文件加载记忆数据，不包含embedding，embedding由Faiss管理"""
-        file_path = self._get_memory_file_path(memory_id)
-        if not os.path.exists(file_path):
+        """
+        从JSON文件加载记忆数据，不包含embedding，embedding由Faiss管理
+
+        解析结果缓存在 LRU 缓存中, 返回的字典与缓存共享, 只供内部只读使用;
+        返回给外部调用方或需要修改时使用 _load_memory_copy。
+        """
+        with self._memory_cache_lock:
+            memory_data = self._memory_cache.get(memory_id)
+            if memory_data is not None:
+                self._memory_cache.move_to_end(memory_id)
+                return memory_data
+
+        if memory_id not in self._all_ids:
+            return None
+
+        try:
+            with open(self._get_memory_file_path(memory_id), 'rb') as f:
+                memory_data = loads(f.read())
+        except FileNotFoundError:
             return None
 
-        with open(file_path, 'r') as f:
-            memory_data = json.load(f)
-            return memory_data
+        with self._memory_cache_lock:
+            self._memory_cache[memory_id] = memory_data
+            if len(self._memory_cache) > self.MEMORY_CACHE_SIZE:
+                self._memory_cache.popitem(last=False)
+        return memory_data
+
+    @staticmethod
+    def _copy_memory(memory_data: Dict[str, Any]) -> Dict[str, Any]:
+        """复制记忆, 调用方修改副本 (包括其中的标签和元数据) 不会影响缓存中的记忆"""
+        memory_copy = dict(memory_data)
+        if isinstance(memory_copy.get('tags'), list):
+            memory_copy['tags'] = list(memory_copy['tags'])
+        if isinstance(memory_copy.get('metadata'), dict):
+            memory_copy['metadata'] = copy.deepcopy(memory_copy['metadata'])
+        return memory_copy
+
+    def _load_memory_copy(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """加载记忆并返回副本, 用于返回给外部调用方"""
+        memory_data = self._load_memory(memory_id)
+        return self._copy_memory(memory_data) if memory_data else None
+
+    def _invalidate_cached_memory(self, memory_id: str):
+        """使缓存中的记忆失效"""
+        with self._memory_cache_lock:
+            self._memory_cache.pop(memory_id, None)
+
+    def _build_secondary_indexes(self):
+        """
+        建立二级索引
+
+        优先回放 memory_index.jsonl 中记录的索引字段, 无需解析记忆文件;
+        记录与记忆目录不一致 (例如在其他进程中修改过数据) 时并行读取一次所有记忆文件并重写该文件。
+        """
+        if self._load_memory_index_file():
+            return
+        for secondary_index in (self._by_type, self._by_tag, self._api_by_path_method,
+                                self._test_cases_by_api, self._index_entries):
+            secondary_index.clear()
+        with ThreadPoolExecutor(max_workers=self.LOAD_WORKERS) as executor:
+            for memory_data in executor.map(self._load_memory, self._get_all_memory_ids()):
+                if memory_data:
+                    self._add_index_entry(memory_data['id'], self._index_entry(memory_data))
+        self._rewrite_memory_index_file()
+
+    def _load_memory_index_file(self) -> bool:
+        """
+        回放 memory_index.jsonl 建立二级索引
+
+        文件中每行记录 [memory_id, 索引字段], 索引字段为 null 表示记忆已删除。
+
+        Returns:
+            是否加载成功
+        """
+        lines = 0
+        try:
+            with open(self.memory_index_file, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    lines += 1
+                    memory_id, entry = loads(line)
+                    self._remove_index_entry(memory_id)
+                    if entry is not None:
+                        content_type, tags, path_method, api_doc_id = entry
+                        path_method = tuple(path_method) if path_method is not None else None
+                        self._add_index_entry(memory_id, (content_type, tuple(tags), path_method, api_doc_id))
+        except (FileNotFoundError, JSONDecodeError, ValueError):
+            return False
+
+        if self._index_entries.keys() != self._all_ids:
+            return False
+        # 被替换或删除的记录过多时压缩文件
+        if lines > 2 * len(self._index_entries):
+            self._rewrite_memory_index_file()
+        return True
+
+    def _rewrite_memory_index_file(self):
+        """按当前的二级索引重写 memory_index.jsonl"""
+        tmp_file = self.memory_index_file + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(b"".join(dumps([memory_id, entry]) + b"\n" for memory_id, entry in self._index_entries.items()))
+        os.replace(tmp_file, self.memory_index_file)
+
+    def _append_memory_index_file(self, memory_id: str, entry: Optional[Tuple[Any, ...]]):
+        """向 memory_index.jsonl 追加一条索引记录"""
+        with open(self.memory_index_file, 'ab') as f:
+            f.write(dumps([memory_id, entry]) + b"\n")
+
+    @staticmethod
+    def _index_entry(memory_data: Dict[str, Any]) -> Tuple[Any, ...]:
+        """提取建立二级索引使用的字段: (类型, 标签, (API路径, 方法), 关联的API文档ID)"""
+        metadata = memory_data.get('metadata') or {}
+        content_type = memory_data.get('content_type')
+        path_method = None
+        api_doc_id = None
+        if content_type == 'api_doc':
+            path_method = (metadata.get('api_path'), metadata.get('method'))
+        elif content_type == 'test_case':
+            api_doc_id = metadata.get('api_doc_id')
+        return content_type, tuple(memory_data.get('tags') or ()), path_method, api_doc_id
+
+    def _index_memory(self, memory_data: Dict[str, Any]):
+        """将记忆加入二级索引并记录到 memory_index.jsonl, 已存在的旧索引项会先被移除"""
+        memory_id = memory_data['id']
+        entry = self._index_entry(memory_data)
+        self._remove_index_entry(memory_id)
+        self._add_index_entry(memory_id, entry)
+        self._append_memory_index_file(memory_id, entry)
+
+    def _unindex_memory(self, memory_id: str):
+        """从二级索引中移除记忆, 并在 memory_index.jsonl 中记录删除"""
+        if self._remove_index_entry(memory_id):
+            self._append_memory_index_file(memory_id, None)
+
+    def _add_index_entry(self, memory_id: str, entry: Tuple[Any, ...]):
+        """将索引字段加入各个二级索引"""
+        content_type, tags, path_method, api_doc_id = entry
+        if path_method is not None:
+            # 与原先的逐个扫描保持一致: 同一路径和方法存在多条记录时保留先出现的一条
+            self._api_by_path_method.setdefault(path_method, memory_id)
+        if content_type == 'test_case':
+            self._test_cases_by_api[api_doc_id].add(memory_id)
+        self._by_type[content_type].add(memory_id)
+        for tag in tags:
+            self._by_tag[tag].add(memory_id)
+        self._index_entries[memory_id] = entry
+
+    def _remove_index_entry(self, memory_id: str) -> bool:
+        """
+        从各个二级索引中移除记忆
+
+        Returns:
+            记忆原先是否在索引中
+        """
+        entry = self._index_entries.pop(memory_id, None)
+        if entry is None:
+            return False
+        content_type, tags, path_method, api_doc_id = entry
+        self._by_type[content_type].discard(memory_id)
+        for tag in tags:
+            self._by_tag[tag].discard(memory_id)
+        if path_method is not None and self._api_by_path_method.get(path_method) == memory_id:
+            del self._api_by_path_method[path_method]
+            # 同一路径和方法还有其他记录时改为指向其中一条
+            for other_id in self._by_type['api_doc']:
+                if self._index_entries[other_id][2] == path_method:
+                    self._api_by_path_method[path_method] = other_id
+                    break
+        if content_type == 'test_case':
+            self._test_cases_by_api[api_doc_id].discard(memory_id)
+        return True
+
+    def _load_memories(self, memory_ids) -> List[Dict[str, Any]]:
+        """按ID加载多条记忆的副本, 跳过已不存在的记忆"""
+        memories = (self._load_memory_copy(memory_id) for memory_id in memory_ids)
+        return [memory_data for memory_data in memories if memory_data]
+
+    def _scan_memory_ids(self) -> Set[str]:
+        """扫描记忆目录下的各个分片子目录, 获取所有记忆的ID"""
+        memory_ids = set()
+        with os.scandir(self.memories_dir) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                self._shard_dirs.add(shard.path)
+                with os.scandir(shard.path) as entries:
+                    memory_ids.update(entry.name[:-5] for entry in entries if entry.name.endswith('.json'))
+        return memory_ids
 
     def _get_all_memory_ids(self) -> List[str]:
         """获取所有记忆的ID列表"""
-        memory_files = [f for f in os.listdir(self.memories_dir) if f.endswith('.json')]
-        return [os.path.splitext(f)[0] for f in memory_files]
+        return list(self._all_ids)
 
     def _format_memory_data(self, content: str, content_type: str,
                             tags: List[str] = None,
                             metadata: Dict[str, Any] = None,
-                            importance: float = 1.0) -> Dict[str, Any]:
-        """格式化记忆数据"""
+                            importance: float = 1.0,
+                            now: str = None) -> Dict[str, Any]:
+        """
+        格式化记忆数据
+
+        Args:
+            now: 创建时间, 批量添加时由调用方统一生成一次; 未提供时取当前时间
+        """
         if tags is None:
             tags = []
         if metadata is None:
             metadata = {}
+        if now is None:
+            now = iso_now()
 
         return {
-            'id': str(uuid.uuid4()),
+            'id': uuid.uuid4().hex,
             'content': content,
             'content_type': content_type,
             'tags': tags,
             'metadata': metadata,
             'importance': importance,
-            'created_at': datetime.datetime.now().isoformat(),
-            'updated_at': datetime.datetime.now().isoformat()
+            'created_at': now,
+            'updated_at': now
         }
 
     def _build_faiss_index(self):
-        """构建或重新构建Faiss索引"""
-        memory_ids = self._get_all_memory_ids()
-        embeddings_list = []
-        indexed_memory_ids = []
-
-        for memory_id in memory_ids:
-            embedding = self._load_embedding(memory_id)
-            if embedding is not None:
-                embeddings_list.append(embedding)
-                indexed_memory_ids.append(memory_id)
-
-        if embeddings_list:
-            embeddings_array = np.array(embeddings_list, dtype=np.float32)
-            self.faiss_index = faiss.IndexFlatL2(self.embedding_dimension)  # 使用 IndexFlatL2 索引
-            self.faiss_index.add(embeddings_array)
-            self.memory_ids_indexed = indexed_memory_ids
-        else:
-            self.faiss_index = faiss.IndexFlatL2(self.embedding_dimension)  # 创建一个空的索引
-            self.memory_ids_indexed = []
+        """
+        构建或重新构建Faiss索引
+
+        先压缩嵌入向量矩阵, 使有效向量连续存放在矩阵开头, 再直接从内存映射的矩阵中一次性加入索引。
+        旧版本保存的向量未经归一化, 重建时在矩阵中原地归一化。
+        """
+        self._compact_embeddings()
+        indexed_memory_ids = sorted(self._emb_rows, key=self._emb_rows.get)
+        embeddings = self._emb_mm[:len(indexed_memory_ids)]
+        if indexed_memory_ids:
+            with self._emb_lock:
+                faiss.normalize_L2(embeddings)
+                self._emb_mm.flush()
+
+        self.faiss_index = self._create_faiss_index(embeddings)
+        self.memory_ids_indexed = indexed_memory_ids
+        self._id_to_row = {memory_id: row for row, memory_id in enumerate(self.memory_ids_indexed)}
+        self._deleted_rows = set()
+
+    def _create_faiss_index(self, embeddings: np.ndarray):
+        """
+        根据向量数量创建Faiss索引, 并加入 embeddings
+
+        向量均已归一化, 使用内积度量。向量数量少于 IVF_THRESHOLD 时使用暴力检索的 IndexFlatIP;
+        否则训练 IndexIVFFlat (聚类数约为 4·sqrt(N), 且每个聚类至少有 39 个训练向量, 即 faiss 建议的下限),
+        抽样估算其相对暴力检索的 recall, 达不到 IVF_MIN_RECALL 时仍使用 IndexFlatIP。
+        """
+        n = len(embeddings)
+        flat_index = faiss.IndexFlatIP(self.embedding_dimension)
+        if n:
+            flat_index.add(embeddings)
+        if n < self.IVF_THRESHOLD:
+            self._trained_size = 0
+            return flat_index
+
+        nlist = max(1, min(int(4 * math.sqrt(n)), n // 39))
+        quantizer = faiss.IndexFlatIP(self.embedding_dimension)
+        index = faiss.IndexIVFFlat(quantizer, self.embedding_dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+        index.nprobe = min(nlist, max(16, nlist // 8))
+        index.add(embeddings)
+        # 无论是否采用 IVF, 向量数量翻倍前都不再重新尝试
+        self._trained_size = n
+
+        recall = self._estimate_ivf_recall(index, flat_index, embeddings)
+        if recall < self.IVF_MIN_RECALL:
+            print(f"IVF 索引 recall@{self.IVF_RECALL_K} 为 {recall:.3f}, 低于 {self.IVF_MIN_RECALL}, 继续使用暴力检索")
+            return flat_index
+        return index
+
+    def _estimate_ivf_recall(self, ivf_index, flat_index, embeddings: np.ndarray) -> float:
+        """以抽样的向量为查询, 估算 IVF 索引相对暴力检索的 recall@IVF_RECALL_K"""
+        n = len(embeddings)
+        rng = np.random.default_rng(0)
+        rows = np.sort(rng.choice(n, size=min(self.IVF_RECALL_SAMPLES, n), replace=False))
+        queries = np.ascontiguousarray(embeddings[rows])
+        k = min(self.IVF_RECALL_K, n)
+        _, exact = flat_index.search(queries, k)
+        _, approx = ivf_index.search(queries, k)
+        hits = sum(len(set(exact_row) & set(approx_row)) for exact_row, approx_row in zip(exact.tolist(), approx.tolist()))
+        return hits / (len(rows) * k)
+
+    def _maybe_rebuild_faiss_index(self):
+        """有效向量数量首次达到 IVF_THRESHOLD 或相对上次训练时翻倍时, 重新构建并训练索引"""
+        live = len(self._id_to_row)
+        if live >= max(self.IVF_THRESHOLD, 2 * self._trained_size):
+            self._build_faiss_index()
+
+    def _load_faiss_index(self) -> bool:
+        """
+        加载上次退出时持久化的Faiss索引
+
+        保存索引时各记忆在嵌入向量矩阵中的行号与当前不完全一致 (例如在其他进程中更新、删除过记忆,
+        或压缩过矩阵) 时视为失效, 因为此时索引中的向量可能已不是记忆当前的向量。
+
+        Returns:
+            是否加载成功
+        """
+        try:
+            index = faiss.read_index(self.faiss_index_file)
+            with open(self.faiss_ids_file, 'rb') as f:
+                saved = loads(f.read())
+        except (RuntimeError, OSError, JSONDecodeError):
+            return False
+
+        if saved.get('emb_rows') != self._emb_rows:
+            return False
+        memory_ids_indexed = saved.get('memory_ids', [])
+        trained_size = saved.get('trained_size', 0)
+        deleted_rows = set(saved.get('deleted_rows', []))
+        id_to_row = {
+            memory_id: row for row, memory_id in enumerate(memory_ids_indexed) if row not in deleted_rows
+        }
+        if (index.d != self.embedding_dimension or index.metric_type != faiss.METRIC_INNER_PRODUCT
+                or index.ntotal != len(memory_ids_indexed)
+                or id_to_row.keys() != self._emb_rows.keys()):
+            return False
+
+        self.faiss_index = index
+        self.memory_ids_indexed = memory_ids_indexed
+        self._id_to_row = id_to_row
+        self._deleted_rows = deleted_rows
+        self._trained_size = trained_size
+        return True
+
+    def save_faiss_index(self):
+        """
+        将Faiss索引及其行到记忆ID的映射持久化到数据目录
+
+        同时保存当前各记忆在嵌入向量矩阵中的行号, 加载时据此判断索引是否仍与嵌入向量一致。
+        """
+        if self.faiss_index is None or not os.path.isdir(self.data_dir):
+            return
+        with self._emb_lock:
+            emb_rows = dict(self._emb_rows)
+        faiss.write_index(self.faiss_index, self.faiss_index_file)
+        with open(self.faiss_ids_file, 'wb') as f:
+            f.write(dumps({
+                'memory_ids': self.memory_ids_indexed,
+                'emb_rows': emb_rows,
+                'deleted_rows': sorted(self._deleted_rows),
+                'trained_size': self._trained_size
+            }))
 
     def _update_faiss_index_single(self, memory_id: str, embedding: np.ndarray):
-        """更新Faiss索引中的单个向量 (简化版本，更高效的更新需要更复杂的索引管理)"""
-        self._build_faiss_index()  # 简单起见，每次更新都重建索引。
+        """
+        增量更新Faiss索引中的单个向量
+
+        新向量追加到索引末尾; 如果该记忆已有向量 (更新记忆), 旧向量所在的行被软删除。
+        """
+        self._soft_delete_from_index(memory_id)
+        if memory_id in self._id_to_row:
+            # 软删除触发了重建, 重建时已从磁盘读入新的向量
+            return
+        self.faiss_index.add(embedding)
+        self._id_to_row[memory_id] = len(self.memory_ids_indexed)
+        self.memory_ids_indexed.append(memory_id)
+        self._maybe_rebuild_faiss_index()
+
+    def _soft_delete_from_index(self, memory_id: str):
+        """
+        从Faiss索引中软删除记忆的向量, 检索时跳过已删除的行
+
+        已删除的行占比超过 REBUILD_DELETED_RATIO 时才重建索引以回收空间。
+        """
+        row = self._id_to_row.pop(memory_id, None)
+        if row is None:
+            return
+        self._deleted_rows.add(row)
+        if len(self._deleted_rows) > self.REBUILD_DELETED_RATIO * len(self.memory_ids_indexed):
+            self._build_faiss_index()
 
     # ========== 基本CRUD操作 ==========
     def add_memory(self,
@@ -198,26 +796,82 @@ class JsonDataAccess:
         if tags:
             self._add_tags(tags)
 
-        # 生成 embedding 向量
-        embedding_vector = self.embedding_model_client.get_embedding(content)
-        embedding_np = np.array(embedding_vector, dtype=np.float32)
+        # 生成 embedding 向量 (相同内容直接复用缓存)
+        embedding_np = self._embed(content)
 
-        # 保存记忆数据 (不包含embedding)
-        self._save_memory(memory_data)
+        # 在I/O线程池中同时保存记忆数据 (不包含embedding) 和归一化后的嵌入向量
+        embedding_np = self._normalize(embedding_np.reshape(1, -1))
+        self._run_io(
+            (self._save_memory, memory_data),
+            (self._store_embeddings, [memory_data['id']], embedding_np)
+        )
 
-        # 保存嵌入向量并更新Faiss索引
-        self._save_embedding(memory_data['id'], embedding_np)
+        # Faiss索引不是线程安全的, 在调用方线程中更新
+        self._update_faiss_index_single(memory_data['id'], embedding_np)
 
         # 加载完整数据（不包括嵌入向量，因为Faiss管理embedding）并返回
-        return self._load_memory(memory_data['id'])
+        return self._load_memory_copy(memory_data['id'])
+
+    def add_memories_bulk(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量添加记忆, 所有内容的 embedding 合并为一次批量请求, 向量一次性加入Faiss索引
+
+        Args:
+            items: 记忆列表, 每一项为 add_memory 的参数字典
+                (content, content_type, 以及可选的 metadata, tags, importance)
+
+        Returns:
+            创建的Memory对象列表, 与 items 顺序一致
+        """
+        if not items:
+            return []
+
+        now = iso_now()
+        memories = [
+            self._format_memory_data(
+                content=item['content'],
+                content_type=item['content_type'],
+                tags=item.get('tags') or [],
+                metadata=item.get('metadata') or {},
+                importance=item.get('importance', 1.0),
+                now=now
+            ) for item in items
+        ]
+
+        # 所有标签合并后只写一次标签文件
+        all_tags = list(dict.fromkeys(tag for memory in memories for tag in memory['tags']))
+        if all_tags:
+            self._add_tags(all_tags)
+            self.flush_tags()
+
+        embeddings = self._embed_batch([memory['content'] for memory in memories])
+        faiss.normalize_L2(embeddings)
+
+        def save_memories():
+            for memory_data in memories:
+                self._save_memory(memory_data)
+
+        self._run_io(
+            (save_memories,),
+            (self._store_embeddings, [memory_data['id'] for memory_data in memories], embeddings)
+        )
+
+        self.faiss_index.add(embeddings)
+        start = len(self.memory_ids_indexed)
+        for offset, memory_data in enumerate(memories):
+            self._id_to_row[memory_data['id']] = start + offset
+            self.memory_ids_indexed.append(memory_data['id'])
+        self._maybe_rebuild_faiss_index()
+
+        return memories
 
     def get_memory_by_id(self, memory_id: str) -> Optional[Dict[str, Any]]:
         """通过ID获取记忆"""
-        return self._load_memory(memory_id)
+        return self._load_memory_copy(memory_id)
 
     def update_memory(self, memory_id: str, content: str = None, embedding: np.ndarray = None, **kwargs) -> bool:
         """更新记忆，可以同时更新内容、元数据和embedding"""
-        memory_data = self._load_memory(memory_id)
+        memory_data = self._load_memory_copy(memory_id)
         if not memory_data:
             return False
 
@@ -233,13 +887,11 @@ class JsonDataAccess:
         if content:
             memory_data['content'] = content
 
-            # 重新生成 embedding 向量
-            embedding_vector = self.embedding_model_client.get_embedding(content)
-            embedding_np = np.array(embedding_vector, dtype=np.float32)
-            embedding = embedding_np  # 使用新生成的 embedding 更新
+            # 重新生成 embedding 向量 (相同内容直接复用缓存)
+            embedding = self._embed(content)  # 使用新生成的 embedding 更新
 
         # 更新时间戳
-        memory_data['updated_at'] = datetime.datetime.now().isoformat()
+        memory_data['updated_at'] = iso_now()
 
         # 保存更新后的记忆 (不包含embedding)
         self._save_memory(memory_data)
@@ -251,27 +903,20 @@ class JsonDataAccess:
         return True
 
     def delete_memory(self, memory_id: str) -> bool:
-        """删除记忆，并重建Faiss索引"""
-        memory_file = self._get_memory_file_path(memory_id)
-        embedding_file = self._get_embedding_file_path(memory_id)
-
-        success = True
-
-        if os.path.exists(memory_file):
-            try:
-                os.remove(memory_file)
-            except OSError:
-                success = False
-
-        if os.path.exists(embedding_file):
-            try:
-                os.remove(embedding_file)
-            except OSError:
-                success = False
+        """删除记忆，并从Faiss索引中软删除其向量"""
+        try:
+            os.remove(self._get_memory_file_path(memory_id))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return False
 
-        if success:
-            self._build_faiss_index()  # 删除后需要重建索引
-        return success
+        self._all_ids.discard(memory_id)
+        self._remove_embedding(memory_id)
+        self._invalidate_cached_memory(memory_id)
+        self._unindex_memory(memory_id)
+        self._soft_delete_from_index(memory_id)
+        return True
 
     # ========== 向量检索 ==========
     def find_similar_memories(self,
@@ -294,12 +939,57 @@ class JsonDataAccess:
         if self.faiss_index is None or self.faiss_index.ntotal == 0:
             return []  # 如果索引为空，则返回空列表
 
-        query_embedding = query_embedding.astype(np.float32).reshape(1, -1)  # 确保数据类型和形状正确
-        D, I = self.faiss_index.search(query_embedding, top_k)  # 使用Faiss搜索
+        # 查询向量复制到当前线程复用的缓冲区中再原地归一化, 避免每次查询分配新数组
+        query_buffer = getattr(self._query_buffers, 'buffer', None)
+        if query_buffer is None:
+            query_buffer = self._query_buffers.buffer = np.empty((1, self.embedding_dimension), dtype=np.float32)
+        np.copyto(query_buffer, query_embedding.reshape(1, -1), casting='same_kind')
+        faiss.normalize_L2(query_buffer)
+        return self._search_normalized(query_buffer, content_type, tags, top_k)[0]
+
+    def find_similar_memories_batch(self,
+                                    queries: np.ndarray,
+                                    content_type: Optional[str] = None,
+                                    tags: Optional[List[str]] = None,
+                                    top_k: int = 5) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        批量查找相似记忆, 所有查询向量只进行一次Faiss检索
 
+        Args:
+            queries: 形状为 (B, d) 的查询向量矩阵
+            content_type: 可选的内容类型过滤
+            tags: 可选的标签过滤
+            top_k: 每个查询返回的最大结果数
+
+        Returns:
+            与查询一一对应的 (Memory, similarity_score) 元组列表的列表, 每个列表按相似度降序排序
+        """
+        if self.faiss_index is None or self.faiss_index.ntotal == 0:
+            return [[] for _ in range(len(queries))]  # 如果索引为空，则返回空列表
+
+        return self._search_normalized(self._normalize(queries), content_type, tags, top_k)
+
+    def _search_normalized(self, queries: np.ndarray,
+                           content_type: Optional[str], tags: Optional[List[str]],
+                           top_k: int) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """对已归一化的 float32 查询矩阵进行一次Faiss检索, 并逐个查询过滤结果"""
+        # 多取出软删除行数量的结果, 保证跳过已删除的行后仍有足够的候选
+        search_k = min(top_k + len(self._deleted_rows), self.faiss_index.ntotal)
+        # 归一化向量的内积即余弦相似度, Faiss已按相似度降序返回, 无需转换和再次排序
+        D, I = self.faiss_index.search(queries, search_k)  # 使用Faiss搜索
+
+        return [
+            self._collect_search_results(I[b], D[b], content_type, tags, top_k)
+            for b in range(len(queries))
+        ]
+
+    def _collect_search_results(self, indices: np.ndarray, scores: np.ndarray,
+                                content_type: Optional[str], tags: Optional[List[str]],
+                                top_k: int) -> List[Tuple[Dict[str, Any], float]]:
+        """将单个查询的Faiss检索结果转换为记忆, 跳过已删除的行并应用过滤条件"""
         results = []
-        for i, index in enumerate(I[0]):
-            if index != -1 and index < len(self.memory_ids_indexed):  # 检查索引是否有效
+        for index, similarity_score in zip(indices, scores):
+            if index != -1 and index < len(self.memory_ids_indexed) and index not in self._deleted_rows:  # 检查索引是否有效
                 memory_id = self.memory_ids_indexed[index]
                 memory_data = self._load_memory(memory_id)
 
@@ -309,12 +999,11 @@ class JsonDataAccess:
                 if tags and not all(tag in memory_data.get('tags', []) for tag in tags):
                     continue
 
-                similarity_score = 1.0 - (D[0][i] / 2.0) if D[0][i] <= 2.0 else 0.0  # 将L2距离转换为粗略的相似度评分 (根据实际情况调整)
-                results.append((memory_data, float(similarity_score)))
+                results.append((self._copy_memory(memory_data), float(similarity_score)))
+                if len(results) == top_k:
+                    break
 
-        # 确保结果数量不超过top_k，并按相似度降序排序 (Faiss已经按距离排序，这里可以简化)
-        results.sort(key=lambda x: x[1], reverse=True)  # 显式按相似度排序, 虽然L2距离排序通常足够
-        return results[:top_k]
+        return results
 
     def search_memories(self,
                         query_text: str,
@@ -334,8 +1023,7 @@ class JsonDataAccess:
             (Memory, similarity_score) 元组的列表，按相似度降序排序
         """
         # 获取查询文本的 embedding 向量
-        query_embedding_vector = self.embedding_model_client.get_embedding(query_text)
-        query_embedding_np = np.array(query_embedding_vector, dtype=np.float32)
+        query_embedding_np = self._embed(query_text)
 
         # 使用 embedding 向量进行搜索
         return self.find_similar_memories(
@@ -345,6 +1033,32 @@ class JsonDataAccess:
             top_k=top_k
         )
 
+    def search_memories_batch(self,
+                              query_texts: List[str],
+                              content_type: Optional[str] = None,
+                              tags: Optional[List[str]] = None,
+                              top_k: int = 5) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        批量搜索相似记忆, 查询文本的 embedding 合并为一次批量请求
+
+        Args:
+            query_texts: 查询文本列表
+            content_type: 可选的内容类型过滤
+            tags: 可选的标签过滤
+            top_k: 每个查询返回的最大结果数
+
+        Returns:
+            与查询文本一一对应的 (Memory, similarity_score) 元组列表的列表
+        """
+        if not query_texts:
+            return []
+        return self.find_similar_memories_batch(
+            queries=self._embed_batch(query_texts),
+            content_type=content_type,
+            tags=tags,
+            top_k=top_k
+        )
+
     # ========== 专门的API文档记忆操作 ==========
     # ... (以下API文档和测试用例记忆操作方法需要修改，移除 embedding 参数，并调用 self.add_memory)
     def add_api_doc_memory(self,
@@ -359,6 +1073,39 @@ class JsonDataAccess:
                            tags: List[str] = None,
                            importance: float = 1.0) -> Dict[str, Any]:
         """添加API文档记忆, 自动生成 embedding"""
+        # 添加记忆，embedding 会在 add_memory 内部自动生成
+        return self.add_memory(
+            **self.api_doc_memory_spec(
+                content=content,
+                api_path=api_path,
+                method=method,
+                summary=summary,
+                description=description,
+                request_example=request_example,
+                response_example=response_example,
+                metadata=metadata,
+                tags=tags,
+                importance=importance
+            )
+        )
+
+    @staticmethod
+    def api_doc_memory_spec(content: str,
+                            api_path: str,
+                            method: str,
+                            summary: str = None,
+                            description: str = None,
+                            request_example: str = None,
+                            response_example: str = None,
+                            metadata: Dict[str, Any] = None,
+                            tags: List[str] = None,
+                            importance: float = 1.0) -> Dict[str, Any]:
+        """
+        构造API文档记忆的 add_memory 参数, 可收集后交给 add_memories_bulk 批量添加
+
+        Returns:
+            add_memory 的参数字典
+        """
         # 合并元数据
         combined_metadata = {
             'api_path': api_path,
@@ -377,30 +1124,18 @@ class JsonDataAccess:
         if 'api' not in combined_tags:
             combined_tags.append('api')
 
-        # 添加记忆，embedding 会在 add_memory 内部自动生成
-        return self.add_memory(
-            content=content,
-            content_type='api_doc',
-            metadata=combined_metadata,
-            tags=combined_tags,
-            importance=importance
-        )
+        return {
+            'content': content,
+            'content_type': 'api_doc',
+            'metadata': combined_metadata,
+            'tags': combined_tags,
+            'importance': importance
+        }
 
     def get_api_doc_by_path_method(self, api_path: str, method: str) -> Optional[Dict[str, Any]]:
         """通过路径和方法获取API文档记忆"""
-        # 获取所有记忆
-        memory_ids = self._get_all_memory_ids()
-
-        for memory_id in memory_ids:
-            memory_data = self._load_memory(memory_id)
-
-            # 检查是否为API文档且匹配路径和方法
-            if (memory_data.get('content_type') == 'api_doc' and
-                    memory_data.get('metadata', {}).get('api_path') == api_path and
-                    memory_data.get('metadata', {}).get('method') == method):
-                return memory_data
-
-        return None
+        memory_id = self._api_by_path_method.get((api_path, method))
+        return self._load_memory_copy(memory_id) if memory_id else None
 
     # ========== 专门的测试用例记忆操作 ==========
     def add_test_case_memory(self,
@@ -440,19 +1175,7 @@ class JsonDataAccess:
 
     def get_test_cases_for_api(self, api_doc_id: str) -> List[Dict[str, Any]]:
         """获取与特定API相关的所有测试用例"""
-        # 获取所有记忆
-        memory_ids = self._get_all_memory_ids()
-        results = []
-
-        for memory_id in memory_ids:
-            memory_data = self._load_memory(memory_id)
-
-            # 检查是否为测试用例且关联到指定API
-            if (memory_data.get('content_type') == 'test_case' and
-                    memory_data.get('metadata', {}).get('api_doc_id') == api_doc_id):
-                results.append(memory_data)
-
-        return results
+        return self._load_memories(self._test_cases_by_api.get(api_doc_id, ()))
 
     # ========== 对话记忆操作 ==========
     def add_conversation_memory(self,
@@ -488,18 +1211,7 @@ class JsonDataAccess:
     # ========== 批量操作 ==========
     def get_all_memories_by_type(self, content_type: str) -> List[Dict[str, Any]]:
         """获取指定类型的所有记忆"""
-        # 获取所有记忆
-        memory_ids = self._get_all_memory_ids()
-        results = []
-
-        for memory_id in memory_ids:
-            memory_data = self._load_memory(memory_id)
-
-            # 检查内容类型
-            if memory_data.get('content_type') == content_type:
-                results.append(memory_data)
-
-        return results
+        return self._load_memories(self._by_type.get(content_type, ()))
 
     def get_memories_by_tags(self, tags: List[str], require_all: bool = False) -> List[Dict[str, Any]]:
         """
@@ -509,24 +1221,14 @@ class JsonDataAccess:
             tags: 标签列表
             require_all: 如果为True，则只返回包含所有指定标签的记忆
         """
-        # 获取所有记忆
-        memory_ids = self._get_all_memory_ids()
-        results = []
-
-        for memory_id in memory_ids:
-            memory_data = self._load_memory(memory_id)
-            memory_tags = memory_data.get('tags', [])
-
-            if require_all:
-                # 要求包含所有标签
-                if all(tag in memory_tags for tag in tags):
-                    results.append(memory_data)
-            else:
-                # 包含任一标签即可
-                if any(tag in memory_tags for tag in tags):
-                    results.append(memory_data)
-
-        return results
+        tag_sets = [self._by_tag.get(tag, set()) for tag in tags]
+        if require_all:
+            # 要求包含所有标签 (未指定标签时返回所有记忆)
+            memory_ids = set.intersection(*tag_sets) if tag_sets else self._index_entries.keys()
+        else:
+            # 包含任一标签即可
+            memory_ids = set().union(*tag_sets)
+        return self._load_memories(memory_ids)
 
     def export_to_csv(self, output_path: str, content_type: str = None):
         """
@@ -536,58 +1238,29 @@ class JsonDataAccess:
             output_path: 输出CSV文件路径
             content_type: 可选的内容类型过滤
         """
-        import csv
-
-        # 获取所有记忆
-        memory_ids = self._get_all_memory_ids()
-        memories = []
+        import pandas as pd
 
-        for memory_id in memory_ids:
-            memory_data = self._load_memory(memory_id)
-            # 应用内容类型过滤
-            if content_type and memory_data.get('content_type') != content_type:
-                continue
-            # 从内存中移除大型嵌入向量，CSV不导出embedding
-            memories.append(memory_data)
+        # 获取所有记忆 (应用内容类型过滤)
+        memory_ids = self._by_type.get(content_type, ()) if content_type else self._get_all_memory_ids()
+        memories = self._load_memories(memory_ids)
 
         if not memories:
             return
 
-        # 确定CSV字段
-        # 获取所有可能的字段
-        all_fields = set()
-        for memory in memories:
-            for key in memory.keys():
-                all_fields.add(key)
+        # 将metadata字段扁平化, 嵌套的值保持原样
+        df = pd.DataFrame(memories)
+        metadata = df.pop('metadata') if 'metadata' in df else [{}] * len(df)
+        metadata_df = pd.json_normalize(
+            [m if isinstance(m, dict) else {} for m in metadata], max_level=0
+        ).add_prefix('metadata_')
 
-        # 将metadata字段扁平化
-        metadata_fields = set()
-        for memory in memories:
-            if 'metadata' in memory and isinstance(memory['metadata'], dict):
-                for key in memory['metadata'].keys():
-                    metadata_fields.add(f"metadata_{key}")
+        # 处理标签列表
+        if 'tags' in df:
+            df['tags'] = df['tags'].map(lambda t: ','.join(t) if isinstance(t, list) else t)
 
-        # 组合所有字段
-        fields = sorted(list(all_fields - {'metadata'})) + sorted(list(metadata_fields))
-
-        # 写入CSV
-        with open(output_path, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fields)
-            writer.writeheader()
-
-            for memory in memories:
-                row = {k: v for k, v in memory.items() if k != 'metadata'}
-
-                # 处理标签列表
-                if 'tags' in row and isinstance(row['tags'], list):
-                    row['tags'] = ','.join(row['tags'])
-
-                # 扁平化metadata
-                if 'metadata' in memory and isinstance(memory['metadata'], dict):
-                    for k, v in memory['metadata'].items():
-                        row[f"metadata_{k}"] = v
-
-                writer.writerow(row)
+        # 组合所有字段并写入CSV, 行尾与 csv 模块的默认输出保持一致
+        fields = sorted(df.columns) + sorted(metadata_df.columns)
+        pd.concat([df, metadata_df], axis=1)[fields].to_csv(output_path, index=False, lineterminator='\r\n')
 
     def backup(self, backup_dir: str):
         """
@@ -609,12 +1282,28 @@ class JsonDataAccess:
         """清除所有数据（危险操作），并重建Faiss索引"""
         # 清除目录
         shutil.rmtree(self.memories_dir)
-        shutil.rmtree(self.embeddings_dir)
         os.remove(self.tags_file)
+        with self._emb_lock:
+            self._emb_mm = None
+        for data_file in (self.embeddings_file, self.embedding_rows_file, self.memory_index_file,
+                          self.faiss_index_file, self.faiss_ids_file):
+            try:
+                os.remove(data_file)
+            except FileNotFoundError:
+                pass
+
+        with self._memory_cache_lock:
+            self._memory_cache.clear()
+        self._all_ids.clear()
+        self._shard_dirs.clear()
+        for secondary_index in (self._by_type, self._by_tag, self._api_by_path_method,
+                                self._test_cases_by_api, self._index_entries):
+            secondary_index.clear()
 
         # 重新创建目录结构
         self._ensure_directories()
         self._load_tags()
+        self._open_embedding_store()
         self._build_faiss_index()  # 清除数据后需要重建索引
         return True
 
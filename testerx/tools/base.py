@@ -1,9 +1,12 @@
+import asyncio
 from typing import Any
 
 
 class Tool:
     """工具基类,所有工具都继承自这个类"""
 
+    __slots__ = ("name", "description", "param_schema")
+
     def __init__(self, name: str, description: str, param_schema: dict):
         self.name = name
         self.description = description
@@ -23,3 +26,12 @@ class Tool:
     def execute(self, arguments: dict) -> Any:
         """执行工具,子类应该重写这个方法"""
         raise NotImplementedError("子类必须实现execute方法")
+
+    async def aexecute(self, arguments: dict) -> Any:
+        """
+        异步执行工具
+
+        默认在线程池中调用 execute; 等待子进程或网络 I/O 的工具可以重写为原生的异步实现,
+        多个工具调用在同一个事件循环中并发执行而不占用线程。
+        """
+        return await asyncio.to_thread(self.execute, arguments)
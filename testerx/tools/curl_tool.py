@@ -1,23 +1,178 @@
-import subprocess
+import asyncio
+import functools
+import hashlib
+import http.cookiejar
+import importlib.util
 import shlex
+import subprocess
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from urllib.parse import urlsplit
 from .base import Tool
+from .response_cache import ResponseCache
+from testerx.utils.json_codec import dumps
+from testerx.utils.subprocess_utils import run_subprocess, run_subprocess_blocking
+
+if TYPE_CHECKING:
+    import httpx
+
+# 请求超时时间 (秒), 与原先 subprocess 调用 curl 的超时保持一致
+CURL_TIMEOUT = 30
+# 安装了 h2 时共享客户端使用 HTTP/2 (与 curl 对 https 的默认协商一致), 访问同一主机的并发请求复用一条连接
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+# curl 未指定 -A 时发送的 User-Agent, 本机没有 curl 命令时使用该默认版本号
+_DEFAULT_CURL_USER_AGENT = "curl/8.5.0"
+
+# 进程内可以直接处理的 curl 参数, 其余参数 (如 -o、-v、-F、@文件) 仍交给 curl 命令执行
+_METHOD_FLAGS = {"-X", "--request"}
+_HEADER_FLAGS = {"-H", "--header"}
+_DATA_FLAGS = {"-d", "--data", "--data-raw", "--data-binary", "--data-ascii"}
+_USER_FLAGS = {"-u", "--user"}
+_USER_AGENT_FLAGS = {"-A", "--user-agent"}
+_IGNORED_FLAGS = {"-s", "--silent", "-S", "--show-error", "--compressed", "-sS", "-Ss"}
+# 需要跟随一个参数值的参数
+_VALUE_FLAGS = _METHOD_FLAGS | _HEADER_FLAGS | _DATA_FLAGS | _USER_FLAGS | _USER_AGENT_FLAGS | {"--url"}
+
+
+def _curl_user_agent() -> str:
+    """返回本机 curl 默认发送的 User-Agent (如 curl/8.5.0)"""
+    try:
+        returncode, stdout, _ = run_subprocess_blocking(["curl", "--version"], 5)
+    except (OSError, subprocess.SubprocessError):
+        return _DEFAULT_CURL_USER_AGENT
+    parts = stdout.split(maxsplit=2)
+    if returncode != 0 or len(parts) < 2 or parts[0] != "curl":
+        return _DEFAULT_CURL_USER_AGENT
+    return f"curl/{parts[1]}"
+
+
+@functools.lru_cache(maxsize=None)
+def _get_http_client() -> "httpx.Client":
+    """
+    进程内共享的 HTTP 客户端
+
+    所有 CurlTool 实例复用同一个连接池, 连续访问同一主机时无需重新建立 TCP/TLS 连接;
+    启用 HTTP/2 时多个请求在同一条连接上多路复用。
+    httpx 在第一次发送请求时才导入。
+
+    与 curl 命令一样每次请求都不携带之前响应设置的 Cookie (客户端的 Cookie 存储拒绝保存任何 Cookie),
+    默认 User-Agent 与本机 curl 一致。
+    """
+    import httpx
+
+    return httpx.Client(
+        http2=HTTP2_AVAILABLE,
+        cookies=http.cookiejar.CookieJar(policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[])),
+        headers={"User-Agent": _curl_user_agent()},
+        timeout=CURL_TIMEOUT,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=64),
+        follow_redirects=False
+    )
+
+
+def _parse_curl_args(args: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    将 curl 命令行参数解析为请求参数
+
+    Args:
+        args: shlex 分割后的命令行参数, 第一个参数为 curl
+
+    Returns:
+        请求参数字典; 遇到不支持的参数时返回 None
+    """
+    request = {
+        "method": None, "url": None, "headers": [], "data": [], "auth": None,
+        "include": False, "head": False, "follow": False, "fail": False
+    }
+    i = 1
+    while i < len(args):
+        arg = args[i]
+        if arg in _VALUE_FLAGS:
+            if i + 1 >= len(args):
+                return None
+            value = args[i + 1]
+            i += 2
+            if arg in _METHOD_FLAGS:
+                request["method"] = value.upper()
+            elif arg in _HEADER_FLAGS:
+                name, sep, header_value = value.partition(":")
+                if not sep:
+                    return None
+                request["headers"].append((name.strip(), header_value.strip()))
+            elif arg in _DATA_FLAGS:
+                if value.startswith("@"):
+                    return None
+                request["data"].append(value)
+            elif arg in _USER_FLAGS:
+                user, _, password = value.partition(":")
+                request["auth"] = (user, password)
+            elif arg in _USER_AGENT_FLAGS:
+                request["headers"].append(("User-Agent", value))
+            else:
+                request["url"] = value
+            continue
+
+        if arg in ("-i", "--include"):
+            request["include"] = True
+        elif arg in ("-I", "--head"):
+            request["head"] = True
+        elif arg in ("-L", "--location"):
+            request["follow"] = True
+        elif arg in ("-f", "--fail"):
+            request["fail"] = True
+        elif arg in _IGNORED_FLAGS:
+            pass
+        elif arg.startswith("-") or request["url"] is not None:
+            return None
+        else:
+            request["url"] = arg
+        i += 1
+
+    if request["url"] is None:
+        return None
+    if "://" not in request["url"]:
+        request["url"] = "http://" + request["url"]
+    if request["method"] is None:
+        request["method"] = "HEAD" if request["head"] else ("POST" if request["data"] else "GET")
+    return request
+
+
+def _cache_scope(url: str) -> str:
+    """缓存条目的范围: 请求的协议和主机 (如 http://example.com:8080)"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
 
 
 class CurlTool(Tool):
     """curl命令行工具"""
 
-    def __init__(self):
+    def __init__(self, cache_path: Optional[str] = None, cache_ttl: float = 60.0):
+        """
+        Args:
+            cache_path: GET/HEAD 请求响应缓存的数据库路径 (如 "~/.cache/testerx/curl.sqlite"),
+                默认为 None 不缓存; 启用后其他方法的请求会清除同一主机的缓存条目
+            cache_ttl: 缓存的响应的有效时间 (秒)
+        """
+        self.response_cache = ResponseCache(cache_path, ttl=cache_ttl) if cache_path else None
+
+        properties = {
+            "command": {
+                "type": "string",
+                "description": "要执行的curl命令，例如 'curl -X GET https://example.com'"
+            }
+        }
+        # 只有启用缓存时才向模型说明缓存行为
+        if self.response_cache is not None:
+            properties["bypass_cache"] = {
+                "type": "boolean",
+                "description": "是否跳过缓存重新请求。相同的GET/HEAD请求在短时间内会直接返回缓存的结果，需要获取最新结果时设为true"
+            }
+
         super().__init__(
             name="execute_curl",
             description="执行curl命令获取HTTP请求结果",
             param_schema={
                 "type": "object",
-                "properties": {
-                    "command": {
-                        "type": "string",
-                        "description": "要执行的curl命令，例如 'curl -X GET https://example.com'"
-                    }
-                },
+                "properties": properties,
                 "required": ["command"]
             }
         )
@@ -29,19 +184,145 @@ class CurlTool(Tool):
                 return {"error": "命令必须以curl开头"}
 
             args = shlex.split(command)
-            result = subprocess.run(args, capture_output=True, text=True, timeout=30)
-
-            if result.returncode == 0:
-                return {
-                    "status": "success",
-                    "stdout": result.stdout,
-                    "stderr": result.stderr
-                }
-            else:
-                return {
-                    "status": "error",
-                    "code": result.returncode,
-                    "stderr": result.stderr
-                }
+            request = _parse_curl_args(args)
+            if request is None:
+                self._invalidate_cache(None)
+                return self._run_subprocess(args)
+            return self._send_cached(request, arguments.get("bypass_cache", False))
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def aexecute(self, arguments: dict) -> dict:
+        """异步执行curl命令: 进程内请求在线程池中发送, 需要调用 curl 命令时使用异步子进程"""
+        command = arguments.get("command", "")
+        try:
+            if not command.strip().startswith('curl'):
+                return {"error": "命令必须以curl开头"}
+
+            args = shlex.split(command)
+            request = _parse_curl_args(args)
+            if request is None:
+                self._invalidate_cache(None)
+                return self._format_result(*await run_subprocess(args, CURL_TIMEOUT))
+            return await asyncio.to_thread(self._send_cached, request, arguments.get("bypass_cache", False))
         except Exception as e:
             return {"error": str(e)}
+
+    def cache_stats(self) -> Optional[dict]:
+        """返回响应缓存的命中统计, 未启用缓存时返回 None"""
+        return self.response_cache.stats() if self.response_cache else None
+
+    def _cache_key(self, request: Dict[str, Any]) -> Optional[str]:
+        """
+        计算请求的缓存键, 只缓存不带请求体的 GET/HEAD 请求
+
+        请求头按名称 (不区分大小写) 排序后参与摘要; 请求头中带有 no-store 或 no-cache 时不缓存。
+        """
+        if self.response_cache is None or request["method"] not in ("GET", "HEAD") or request["data"]:
+            return None
+        headers = sorted((name.lower(), value) for name, value in request["headers"])
+        if any(name == "cache-control" and ("no-store" in value or "no-cache" in value) for name, value in headers):
+            return None
+        canonical = [
+            request["method"], request["url"], headers, request["auth"],
+            request["include"], request["head"], request["follow"], request["fail"]
+        ]
+        return hashlib.sha256(dumps(canonical)).hexdigest()
+
+    def _invalidate_cache(self, request: Optional[Dict[str, Any]]):
+        """
+        清除可能因请求而过期的缓存结果
+
+        request 为 None (交给 curl 命令执行, 无法确定请求的方法和地址) 时清除全部缓存,
+        否则 GET/HEAD 以外的请求清除同一主机的缓存。
+        """
+        if self.response_cache is None:
+            return
+        if request is None:
+            self.response_cache.invalidate()
+        elif request["method"] not in ("GET", "HEAD"):
+            self.response_cache.invalidate(_cache_scope(request["url"]))
+
+    def _send_cached(self, request: Dict[str, Any], bypass_cache: bool = False) -> dict:
+        """发送请求, 可缓存的请求优先返回未过期的缓存结果, 成功的结果写入缓存"""
+        key = self._cache_key(request)
+        if key is not None and not bypass_cache:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        self._invalidate_cache(request)
+        result = self._send(request)
+        # 请求完成后再清除一次, 避免请求期间其他线程写入修改前的结果
+        self._invalidate_cache(request)
+        if key is not None and result.get("status") == "success":
+            self.response_cache.set(key, result, scope=_cache_scope(request["url"]))
+        return result
+
+    def _send(self, request: Dict[str, Any]) -> dict:
+        """
+        通过共享的连接池在进程内发送请求, 返回与 curl 命令相同格式的结果
+
+        与 curl 一致: 默认 HTTP 错误状态码也视为成功, 只有指定 -f 时返回退出码 22;
+        连接失败和超时分别对应 curl 的退出码 7 和 28。
+        """
+        import httpx
+
+        headers = request["headers"]
+        content = None
+        if request["data"]:
+            content = "&".join(request["data"]).encode()
+            if not any(name.lower() == "content-type" for name, _ in headers):
+                headers = headers + [("Content-Type", "application/x-www-form-urlencoded")]
+
+        try:
+            response = _get_http_client().request(
+                request["method"],
+                request["url"],
+                headers=headers,
+                content=content,
+                auth=request["auth"],
+                follow_redirects=request["follow"]
+            )
+        except httpx.TimeoutException as e:
+            return {"status": "error", "code": 28, "stderr": f"curl: (28) {e}"}
+        except httpx.ConnectError as e:
+            return {"status": "error", "code": 7, "stderr": f"curl: (7) {e}"}
+
+        if request["fail"] and response.status_code >= 400:
+            return {
+                "status": "error",
+                "code": 22,
+                "stderr": f"curl: (22) The requested URL returned error: {response.status_code}"
+            }
+
+        stdout = "" if request["head"] else response.text
+        if request["include"] or request["head"]:
+            status_line = f"{response.http_version} {response.status_code} {response.reason_phrase}\r\n"
+            header_lines = "".join(f"{name}: {value}\r\n" for name, value in response.headers.multi_items())
+            stdout = status_line + header_lines + "\r\n" + stdout
+        return {
+            "status": "success",
+            "stdout": stdout,
+            "stderr": ""
+        }
+
+    @classmethod
+    def _run_subprocess(cls, args: List[str]) -> dict:
+        """调用 curl 命令执行进程内无法处理的请求"""
+        return cls._format_result(*run_subprocess_blocking(args, CURL_TIMEOUT))
+
+    @staticmethod
+    def _format_result(returncode: int, stdout: str, stderr: str) -> dict:
+        if returncode == 0:
+            return {
+                "status": "success",
+                "stdout": stdout,
+                "stderr": stderr
+            }
+        else:
+            return {
+                "status": "error",
+                "code": returncode,
+                "stderr": stderr
+            }
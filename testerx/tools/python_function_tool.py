@@ -1,7 +1,35 @@
+import functools
 import inspect
+import typing
 from typing import Callable, Optional, Dict, List, Any
 from .base import Tool
 
+# Python 类型到 JSON Schema 类型的映射
+_TYPE_MAP = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    List: "array",
+    dict: "object",
+    Dict: "object",
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_signature(func: Callable) -> inspect.Signature:
+    """按函数缓存 inspect.signature 的结果"""
+    return inspect.signature(func)
+
+
+def _get_signature(func: Callable) -> inspect.Signature:
+    """获取函数签名, 不可哈希的可调用对象直接计算"""
+    try:
+        return _cached_signature(func)
+    except TypeError:
+        return inspect.signature(func)
+
 
 class PythonFunctionTool(Tool):
     """将Python函数包装为工具"""
@@ -19,8 +47,21 @@ class PythonFunctionTool(Tool):
         )
 
     def _generate_param_schema(self) -> dict:
-        """从函数签名生成JSON Schema"""
-        sig = inspect.signature(self.func)
+        """
+        从函数签名生成JSON Schema
+
+        生成的 schema 保存在函数的 __testerx_schema__ 属性上, 同一个函数再次包装为工具时直接复用。
+        """
+        schema = getattr(self.func, "__testerx_schema__", None)
+        if schema is not None:
+            return schema
+
+        sig = _get_signature(self.func)
+        try:
+            # 一次解析所有注解 (包括字符串形式的注解)
+            type_hints = typing.get_type_hints(self.func)
+        except Exception:
+            type_hints = {}
         properties = {}
         required = []
 
@@ -28,30 +69,27 @@ class PythonFunctionTool(Tool):
             if param.default is inspect.Parameter.empty:
                 required.append(param_name)
 
-            param_type = param.annotation if param.annotation is not inspect.Parameter.empty else None
+            param_type = type_hints.get(param_name, param.annotation)
             param_info = {"description": f"{param_name}参数"}
 
-            if param_type:
-                if param_type == str:
-                    param_info["type"] = "string"
-                elif param_type == int:
-                    param_info["type"] = "integer"
-                elif param_type == float:
-                    param_info["type"] = "number"
-                elif param_type == bool:
-                    param_info["type"] = "boolean"
-                elif param_type == list or param_type == List:
-                    param_info["type"] = "array"
-                elif param_type == dict or param_type == Dict:
-                    param_info["type"] = "object"
+            if param_type is not inspect.Parameter.empty:
+                schema_type = _TYPE_MAP.get(param_type)
+                if schema_type:
+                    param_info["type"] = schema_type
 
             properties[param_name] = param_info
 
-        return {
+        schema = {
             "type": "object",
             "properties": properties,
             "required": required
         }
+        try:
+            self.func.__testerx_schema__ = schema
+        except AttributeError:
+            # 绑定方法、内置函数等不支持设置属性, 每次重新生成
+            pass
+        return schema
 
     def execute(self, arguments: dict) -> Any:
         """执行包装的Python函数"""
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from testerx.utils.json_codec import dumps, loads
+
+
+class ResponseCache:
+    """
+    基于 SQLite 的磁盘 LRU 缓存, 按请求摘要保存幂等请求的结果
+
+    条目在 ttl 秒后过期, 条目数超过 max_entries 时淘汰最久未访问的条目。
+    """
+
+    def __init__(self, path: str, ttl: float = 60.0, max_entries: int = 1024):
+        """
+        Args:
+            path: SQLite 数据库文件路径
+            ttl: 缓存条目的有效时间 (秒)
+            max_entries: 最多保存的条目数
+        """
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """第一次访问时才打开数据库, 只创建工具而不发送请求时不会产生磁盘文件"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL, scope TEXT)"
+            )
+            # 旧版本创建的表没有 scope 列
+            if "scope" not in {row[1] for row in conn.execute("PRAGMA table_info(responses)")}:
+                conn.execute("ALTER TABLE responses ADD COLUMN scope TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取未过期的缓存结果, 未命中时返回 None"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return loads(row[0])
+
+    def set(self, key: str, value: Any, scope: Optional[str] = None):
+        """
+        写入缓存结果, 并清理过期及超出容量的条目
+
+        Args:
+            key: 缓存键
+            value: 缓存的结果
+            scope: 条目所属的范围 (如请求的主机), 可通过 invalidate 按范围删除
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires, accessed, scope) VALUES (?, ?, ?, ?, ?)",
+                (key, dumps(value), now + self.ttl, now, scope)
+            )
+            conn.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def invalidate(self, scope: Optional[str] = None):
+        """删除属于 scope 的缓存条目, scope 为 None 时删除所有条目"""
+        with self._lock:
+            conn = self._connect()
+            if scope is None:
+                conn.execute("DELETE FROM responses")
+            else:
+                conn.execute("DELETE FROM responses WHERE scope = ?", (scope,))
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存的命中统计和当前条目数"""
+        with self._lock:
+            size = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "size": size, "path": self.path}
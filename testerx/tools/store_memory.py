@@ -1,7 +1,6 @@
 from typing import Any
 from .base import Tool
-import time
-from datetime import datetime
+from testerx.utils.time_utils import iso_now
 
 
 class MemoryStorageTool(Tool):
@@ -56,9 +55,7 @@ class MemoryStorageTool(Tool):
             metadata = arguments.get("metadata", {})
 
             # 添加时间戳
-            metadata["timestamp"] = datetime.now().isoformat()
-
-            print(arguments)
+            metadata["timestamp"] = iso_now()
 
             return {
                 "status": "success",
@@ -1,14 +1,20 @@
+import re
 import shlex
-import subprocess
 from typing import List
 from .base import Tool
+from testerx.utils.subprocess_utils import run_subprocess, run_subprocess_blocking
+
+# 命令执行的超时时间 (秒)
+COMMAND_TIMEOUT = 30
+# 不含空白、引号和反斜杠的单个参数, 无需经过 shlex 词法分析
+_SIMPLE_COMMAND = re.compile(r"[^\s'\"\\]+")
 
 
 class SystemCommandTool(Tool):
     """系统命令执行工具"""
 
     def __init__(self, allowed_commands: List[str] = None):
-        self.allowed_commands = allowed_commands or []
+        self.allowed_commands = frozenset(allowed_commands or ())
 
         super().__init__(
             name="execute_system_command",
@@ -25,28 +31,51 @@ class SystemCommandTool(Tool):
             }
         )
 
-    def execute(self, arguments: dict) -> dict:
+    def _split_command(self, arguments: dict):
+        """
+        分割并检查命令
+
+        Returns:
+            (命令参数列表, None) 或 (None, 错误结果)
+        """
         command = arguments.get("command", "")
-        try:
+        if _SIMPLE_COMMAND.fullmatch(command):
+            command_parts = [command]
+        else:
             command_parts = shlex.split(command)
-            if not command_parts:
-                return {"error": "空命令"}
-
-            if self.allowed_commands and command_parts[0] not in self.allowed_commands:
-                return {"error": f"不允许执行命令: {command_parts[0]}"}
-
-            result = subprocess.run(
-                command_parts,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-
-            return {
-                "status": "success" if result.returncode == 0 else "error",
-                "code": result.returncode,
-                "stdout": result.stdout,
-                "stderr": result.stderr
-            }
+        if not command_parts:
+            return None, {"error": "空命令"}
+
+        if self.allowed_commands and command_parts[0] not in self.allowed_commands:
+            return None, {"error": f"不允许执行命令: {command_parts[0]}"}
+        return command_parts, None
+
+    @staticmethod
+    def _format_result(returncode: int, stdout: str, stderr: str) -> dict:
+        return {
+            "status": "success" if returncode == 0 else "error",
+            "code": returncode,
+            "stdout": stdout,
+            "stderr": stderr
+        }
+
+    def execute(self, arguments: dict) -> dict:
+        try:
+            command_parts, error = self._split_command(arguments)
+            if error:
+                return error
+
+            return self._format_result(*run_subprocess_blocking(command_parts, COMMAND_TIMEOUT))
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def aexecute(self, arguments: dict) -> dict:
+        """异步执行命令, 等待子进程期间不占用线程"""
+        try:
+            command_parts, error = self._split_command(arguments)
+            if error:
+                return error
+
+            return self._format_result(*await run_subprocess(command_parts, COMMAND_TIMEOUT))
         except Exception as e:
             return {"error": str(e)}
@@ -1,7 +1,32 @@
-import json
-from typing import Dict, List, Any, Callable, Optional
+import asyncio
+import functools
+import sys
+from typing import Dict, FrozenSet, List, Any, Callable, Optional, Tuple
 from .base import Tool
 from .python_function_tool import PythonFunctionTool
+from testerx.utils.json_codec import JSONDecodeError, dumps, loads
+
+
+@functools.singledispatch
+def serialize_tool_result(result: Any) -> str:
+    """
+    将工具执行结果序列化为 tool 消息的 content, 按结果类型分派
+
+    默认序列化为 JSON 文本; 字符串结果原样返回, bytes 结果视为已序列化的 UTF-8 文本。
+    工具可以直接返回 bytes, 在工具内部完成一次序列化。
+    """
+    return dumps(result).decode()
+
+
+@serialize_tool_result.register
+def _(result: str) -> str:
+    return result
+
+
+@serialize_tool_result.register(bytes)
+@serialize_tool_result.register(bytearray)
+def _(result) -> str:
+    return result.decode()
 
 
 class ToolManager:
@@ -9,10 +34,14 @@ class ToolManager:
 
     def __init__(self):
         self.tools: Dict[str, Tool] = {}
+        # 工具定义在进程生命周期内基本不变, 按工具名集合缓存, 注册新工具时清空
+        self._definitions_cache: Dict[Optional[FrozenSet[str]], Tuple[dict, ...]] = {}
 
     def register_tool(self, tool: Tool) -> None:
-        """注册一个新工具"""
+        """注册一个新工具, 工具名驻留后作为键, 模型返回的工具名查找时可以直接比较对象"""
+        tool.name = sys.intern(tool.name)
         self.tools[tool.name] = tool
+        self._definitions_cache.clear()
 
     def register_function(self, func=None, *, name=None, description=None):
         """将Python函数注册为工具的装饰器"""
@@ -26,26 +55,66 @@ class ToolManager:
             return decorator
         return decorator(func)
 
-    def get_tool_definitions(self, tool_names: List[str] = None) -> List[dict]:
-        """获取指定工具的定义"""
-        if tool_names is None:
-            return [tool.get_definition() for tool in self.tools.values()]
+    def get_tool_definitions(self, tool_names: List[str] = None) -> Tuple[dict, ...]:
+        """获取指定工具的定义, 返回的元组会被缓存复用, 调用方不应修改其中的定义"""
+        key = frozenset(tool_names) if tool_names is not None else None
+        definitions = self._definitions_cache.get(key)
+        if definitions is not None:
+            return definitions
 
-        definitions = []
-        for name in tool_names:
-            if name in self.tools:
-                definitions.append(self.tools[name].get_definition())
+        if tool_names is None:
+            definitions = tuple(tool.get_definition() for tool in self.tools.values())
+        else:
+            definitions = tuple(self.tools[name].get_definition() for name in tool_names if name in self.tools)
+        self._definitions_cache[key] = definitions
         return definitions
 
+    def execute_tool_serialized(self, tool_name: str, arguments: dict) -> Tuple[Any, str]:
+        """执行指定的工具, 返回 (原始结果, 序列化后的 tool 消息内容) 元组"""
+        result = self.execute_tool(tool_name, arguments)
+        return result, serialize_tool_result(result)
+
     def execute_tool(self, tool_name: str, arguments: dict) -> Any:
         """执行指定的工具"""
-        if tool_name not in self.tools:
+        tool = self.tools.get(tool_name)
+        if tool is None:
             return {"error": f"未知工具: {tool_name}"}
 
         try:
-            parsed_args = json.loads(arguments) if isinstance(arguments, str) else arguments
-            return self.tools[tool_name].execute(parsed_args)
-        except json.JSONDecodeError:
+            parsed_args = loads(arguments) if isinstance(arguments, (str, bytes)) else arguments
+            return tool.execute(parsed_args)
+        except JSONDecodeError:
             return {"error": "参数解析失败"}
         except Exception as e:
             return {"error": f"工具执行失败: {str(e)}"}
+
+    async def aexecute_tool_serialized(self, tool_name: str, arguments: dict) -> Tuple[Any, str]:
+        """异步执行指定的工具, 返回 (原始结果, 序列化后的 tool 消息内容) 元组"""
+        result = await self.aexecute_tool(tool_name, arguments)
+        return result, serialize_tool_result(result)
+
+    async def aexecute_tool(self, tool_name: str, arguments: dict) -> Any:
+        """异步执行指定的工具, 优先使用工具的原生异步实现"""
+        tool = self.tools.get(tool_name)
+        if tool is None:
+            return {"error": f"未知工具: {tool_name}"}
+
+        try:
+            parsed_args = loads(arguments) if isinstance(arguments, (str, bytes)) else arguments
+            return await tool.aexecute(parsed_args)
+        except JSONDecodeError:
+            return {"error": "参数解析失败"}
+        except Exception as e:
+            return {"error": f"工具执行失败: {str(e)}"}
+
+    async def execute_batch(self, calls: List[Tuple[str, Any]]) -> List[Any]:
+        """
+        并发执行一批工具调用
+
+        Args:
+            calls: (工具名, 参数) 元组的列表
+
+        Returns:
+            与 calls 顺序一致的执行结果列表
+        """
+        return list(await asyncio.gather(*(self.aexecute_tool(name, arguments) for name, arguments in calls)))
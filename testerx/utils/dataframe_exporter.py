@@ -1,5 +1,8 @@
-import pandas as pd
+import csv
 import io
+from typing import List
+
+import pandas as pd
 
 
 class DataFrameToStringConverter:
@@ -34,17 +37,36 @@ class DataFrameToStringConverter:
         Returns:
             str: DataFrame 的字符串表示形式。
         """
-        output_buffer = io.StringIO()  # 使用StringIO 避免直接操作文件，提高效率
-
-        df.to_csv(
-            output_buffer,
+        # path_or_buf 为 None 时 to_csv 直接返回字符串, 省去 StringIO 缓冲区及 getvalue() 的整份拷贝
+        return df.to_csv(
+            None,
             sep=self.col_sep,
             lineterminator=self.row_sep,  # 更正为 lineterminator
             header=self.include_header,
             index=self.index
         )
 
-        return output_buffer.getvalue()
+    def convert_records_to_string(self, records: List[dict]) -> str:
+        """
+        将记录列表转换为字符串, 结果与 convert_to_string(pd.DataFrame(records)) 相同, 但不构建 DataFrame。
+
+        Args:
+            records (List[dict]): 记录列表, 每条记录为 列名 -> 值 的字典, 值为字符串或 None。
+                列按各键首次出现的顺序排列, 记录中缺失的列输出为空。
+
+        Returns:
+            str: 记录的字符串表示形式。
+        """
+        columns = list(dict.fromkeys(key for record in records for key in record))
+        # pandas 的 to_csv 同样由 csv.writer 输出, 引号和转义规则一致
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=self.col_sep, lineterminator=self.row_sep)
+        if self.include_header:
+            writer.writerow([''] + columns if self.index else columns)
+        for i, record in enumerate(records):
+            row = [record.get(column) for column in columns]
+            writer.writerow([i] + row if self.index else row)
+        return buffer.getvalue()
 
 
 # 示例用法
@@ -0,0 +1,59 @@
+import dataclasses
+import json
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError 是 json.JSONDecodeError 的子类, 两种实现都可以用它捕获解析错误
+JSONDecodeError = json.JSONDecodeError
+
+
+def _fallback_default(obj: Any) -> Any:
+    """标准库 json 的默认序列化函数, 与 orjson 对 dataclass 和 numpy 数组的处理保持一致"""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any, indent: bool = False, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """
+    将对象序列化为 UTF-8 编码的 JSON bytes, 非 ASCII 字符原样输出
+
+    安装了 orjson 时使用 orjson, 否则回退到标准库 json。
+
+    Args:
+        obj: 要序列化的对象
+        indent: 是否使用 2 个空格缩进
+        default: 处理无法直接序列化的对象的函数
+
+    Returns:
+        JSON bytes
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option)
+    return json.dumps(
+        obj, ensure_ascii=False, indent=2 if indent else None, default=default or _fallback_default
+    ).encode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """
+    解析 JSON 文本或 bytes
+
+    Args:
+        data: JSON 文本或 UTF-8 编码的 bytes
+
+    Returns:
+        解析后的对象
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
@@ -1,10 +1,23 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional
 from dataclasses import dataclass, asdict
-import json
-from collections import OrderedDict
-import csv
 import pandas as pd
 import os
+import re
+from testerx.utils.json_codec import dumps, loads
+
+# 支持的 HTTP 方法, 按字母顺序排列
+_HTTP_METHODS = ('delete', 'get', 'patch', 'post', 'put')
+# to_model_dataframe 中每个端点各不相同的列
+_MODEL_COLUMNS = (
+    'endpoint', 'full_url', 'summary', 'description', 'tags', 'parameters', 'request_body', 'responses'
+)
+# 写入 CSV 文件时使用的缓冲区大小, pandas 分块写入时减少系统调用
+_WRITE_BUFFER_SIZE = 1 << 20
+# to_csv 输出的表头
+_CSV_HEADERS = (
+    "path", "method", "summary", "description", "operationId", "tags",
+    "parameters", "requestBody", "responses"
+)
 
 
 @dataclass
@@ -13,7 +26,7 @@ class OpenAPIComponent:
     description: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Parameter:
     """表示 API 参数"""
     name: str
@@ -23,7 +36,7 @@ class Parameter:
     required: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class RequestBody:
     """表示请求体"""
     content: Dict[str, Dict[str, Any]]
@@ -31,14 +44,14 @@ class RequestBody:
     required: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class Response:
     """表示 API 响应"""
     content: Dict[str, Dict[str, Any]]
     description: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Operation:
     """表示 API 操作"""
     responses: Dict[str, Response]
@@ -62,14 +75,19 @@ class OpenAPIParser:
             spec_dict: OpenAPI 规范字典
         """
         if spec_path:
-            with open(spec_path, 'r', encoding='utf-8') as f:
-                self.spec = json.load(f)
+            with open(spec_path, 'rb') as f:
+                self.spec = loads(f.read())
         elif spec_dict:
             self.spec = spec_dict
         else:
             raise ValueError("必须提供 spec_path 或 spec_dict 之一")
 
         self.validate_version()
+        # get_paths 和 get_base_url 的缓存结果
+        self._paths = None
+        self._base_url = None
+        # _extract_schema_details 的结果, 以规范中 schema 字典的 id 为键
+        self._schema_details = {}
 
     def validate_version(self):
         """验证 OpenAPI 版本"""
@@ -131,17 +149,37 @@ class OpenAPIParser:
         )
 
     def get_paths(self) -> Dict[str, Dict[str, Operation]]:
-        """获取所有路径及其操作，按路径和方法排序"""
-        paths = OrderedDict()
-        for path in sorted(self.spec.get('paths', {}).keys()):
-            path_item = self.spec['paths'][path]
-            operations = OrderedDict()
-            for method in sorted(['get', 'post', 'put', 'delete', 'patch']):
+        """
+        获取所有路径及其操作，按路径和方法排序
+
+        解析结果在第一次调用时生成并缓存, 调用方不应修改返回的结果。
+        """
+        if self._paths is not None:
+            return self._paths
+
+        paths = {}
+        spec_paths = self.spec.get('paths', {})
+        for path in sorted(spec_paths):
+            path_item = spec_paths[path]
+            operations = {}
+            for method in _HTTP_METHODS:
                 if method in path_item:
                     operations[method] = self.parse_operation(path_item[method])
             paths[path] = operations
+        self._paths = paths
         return paths
 
+    def _iter_raw_paths(self):
+        """
+        按路径和方法排序, 逐个生成 (路径, [(方法, 原始操作字典), ...])
+
+        导出方法直接读取原始规范字典, 不构建 Operation 等数据类; get_paths 保留给外部调用方。
+        """
+        spec_paths = self.spec.get('paths', {})
+        for path in sorted(spec_paths):
+            path_item = spec_paths[path]
+            yield path, [(method, path_item[method]) for method in _HTTP_METHODS if method in path_item]
+
     def get_components(self) -> Dict[str, Any]:
         """获取组件定义"""
         return self.spec.get('components', {})
@@ -149,58 +187,76 @@ class OpenAPIParser:
     def get_servers(self) -> Dict[str, Any]:
         return self.spec.get('servers', {})
 
+    def get_base_url(self) -> str:
+        """获取第一个服务器的 URL 作为基础 URL, 没有服务器信息时返回空字符串"""
+        if self._base_url is None:
+            servers = self.get_servers()
+            server_urls = [server.get('url', '') for server in servers] if isinstance(servers, list) else []
+            self._base_url = server_urls[0] if server_urls else ''
+        return self._base_url
+
     def get_info(self) -> Dict[str, Any]:
         """获取 API 信息"""
         return self.spec.get('info', {})
 
     def compress_spec(self) -> Dict[str, Any]:
-        """生成压缩后的 OpenAPI 规范"""
+        """
+        生成压缩后的 OpenAPI 规范
+
+        直接从原始规范字典中选取需要的字段, 不经过 Operation 等数据类的中间转换。
+        """
         compressed = {
             'info': self.get_info(),
             'servers': self.get_servers(),
             'paths': {}
         }
 
-        paths = self.get_paths()
-        for path, operations in paths.items():
+        for path, operations in self._iter_raw_paths():
             compressed_path = {}
-            for method, operation in operations.items():
-                compressed_op = {
-                    'summary': operation.summary,
-                    'description': operation.description,
-                    'operationId': operation.operationId,
-                    'tags': operation.tags,
+            for method, operation in operations:
+                request_body = operation['requestBody'] if 'requestBody' in operation else None
+                compressed_path[method] = {
+                    'summary': operation.get('summary'),
+                    'description': operation.get('description'),
+                    'operationId': operation.get('operationId'),
+                    'tags': operation.get('tags'),
                     'parameters': [
                         {
-                            'name': param.name,
-                            'in': param.in_,
-                            'required': param.required,
-                            'schema': param.schema
+                            'name': param['name'],
+                            'in': param['in'],
+                            'required': param.get('required', False),
+                            'schema': param.get('schema', {})
                         }
-                        for param in operation.parameters or []
+                        for param in operation.get('parameters') or []
                     ],
                     'requestBody': {
-                        'required': operation.requestBody.required if operation.requestBody else False,
-                        'content': operation.requestBody.content if operation.requestBody else {}
+                        'required': request_body.get('required', False) if request_body is not None else False,
+                        'content': request_body['content'] if request_body is not None else {}
                     },
                     'responses': {
                         code: {
-                            'description': resp.description,
-                            'content': resp.content
+                            'description': resp.get('description'),
+                            'content': resp.get('content', {})
                         }
-                        for code, resp in operation.responses.items()
+                        for code, resp in operation['responses'].items()
                     }
                 }
-                compressed_path[method] = compressed_op
             compressed['paths'][path] = compressed_path
 
         return compressed
 
-    def save_compressed_spec(self, output_path: str):
-        """保存压缩后的 OpenAPI 规范到文件"""
-        compressed_spec = self.compress_spec()
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(compressed_spec, f, indent=2, ensure_ascii=False)
+    def save_compressed_spec(self, output_path: str, compressed_spec: Dict[str, Any] = None):
+        """
+        保存压缩后的 OpenAPI 规范到文件
+
+        Args:
+            output_path: 输出文件路径
+            compressed_spec: 已生成的压缩规范, 为 None 时调用 compress_spec 生成
+        """
+        if compressed_spec is None:
+            compressed_spec = self.compress_spec()
+        with open(output_path, 'wb') as f:
+            f.write(dumps(compressed_spec, indent=True))
 
     def to_csv(self, output_path: str):
         """
@@ -209,58 +265,116 @@ class OpenAPIParser:
         Args:
             output_path: 输出 CSV 文件路径
         """
-        # 定义 CSV 表头
-        headers = [
-            "path", "method", "summary", "description", "operationId", "tags",
-            "parameters", "requestBody", "responses"
-        ]
+        # 由 pandas 的 C 实现完成 CSV 编码, 行结束符与 csv 模块默认的 excel 方言保持一致
+        df = pd.DataFrame.from_records(self._iter_csv_rows(), columns=_CSV_HEADERS)
+        with open(output_path, 'w', newline='', encoding='utf-8', buffering=_WRITE_BUFFER_SIZE) as f:
+            df.to_csv(f, index=False, lineterminator='\r\n')
+
+    def _iter_csv_rows(self):
+        """逐个生成 to_csv 的数据行"""
+        join = ";".join
+        for path, operations in self._iter_raw_paths():
+            for method, operation in operations:
+                parameters, request_body, responses = self._flatten_operation(operation, 'csv')
 
-        # 准备数据行
-        rows = []
-        paths = self.get_paths()
-        for path, operations in paths.items():
-            for method, operation in operations.items():
-                # 扁平化参数
-                parameters = ";".join(
-                    [
-                        f"{param.name}({param.in_})"
-                        for param in operation.parameters or []
-                    ]
-                )
+                # 扁平化标签
+                tags = join(operation.get('tags') or ())
 
-                # 扁平化请求体
-                request_body = ""
-                if operation.requestBody:
-                    request_body = ";".join(
-                        [
-                            f"{content_type}({schema.get('type', 'object')})"
-                            for content_type, schema in operation.requestBody.content.items()
-                        ]
-                    )
-
-                # 扁平化响应
-                responses = ";".join(
-                    [
-                        f"{code}({resp.description})"
-                        for code, resp in operation.responses.items()
-                    ]
+                yield (
+                    path, method, operation.get('summary') or "", operation.get('description') or "",
+                    operation.get('operationId') or "", tags, parameters, request_body, responses
                 )
 
-                # 扁平化标签
-                tags = ";".join(operation.tags or [])
+    def _flatten_operation(self, operation: Dict[str, Any], style: str) -> tuple[str, str, str]:
+        """
+        将操作的参数、请求体和响应扁平化为字符串, to_csv、to_model_dataframe 和 iter_api_details_by_path 共用
 
-                # 构建一行数据
-                row = [
-                    path, method, operation.summary or "", operation.description or "",
-                                  operation.operationId or "", tags, parameters, request_body, responses
-                ]
-                rows.append(row)
+        Args:
+            operation: 原始的操作字典
+            style: 输出形式
+                'csv': 分号分隔的简短形式, 如 "id(path)"
+                'model': 换行分隔, 类型取自 _extract_schema_details, 描述截断
+                'details': 换行分隔, 保留完整描述和 schema 的原始类型
 
-        # 写入 CSV 文件
-        with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(headers)  # 写入表头
-            writer.writerows(rows)  # 写入数据行
+        Returns:
+            (参数, 请求体, 响应) 字符串元组
+        """
+        sep = ";" if style == 'csv' else "\n"
+        parameters = sep.join([self._flatten_parameter(param, style) for param in operation.get('parameters') or ()])
+
+        request_body = operation.get('requestBody')
+        request_body = sep.join([
+            line
+            for content_type, content_info in request_body['content'].items()
+            for line in self._flatten_request_content(content_type, content_info, style)
+        ]) if request_body else ""
+
+        responses = sep.join([
+            line
+            for status_code, response in operation['responses'].items()
+            for line in self._flatten_response(status_code, response, style)
+        ])
+        return parameters, request_body, responses
+
+    def _flatten_parameter(self, param: Dict[str, Any], style: str) -> str:
+        """扁平化单个参数, style 含义与 _flatten_operation 相同"""
+        if style == 'csv':
+            return f"{param['name']}({param['in']})"
+
+        schema = param.get('schema', {})
+        required = "必填" if param.get('required', False) else "可选"
+        desc = param.get('description') or ""
+        if style == 'model':
+            param_type = self._extract_schema_details(schema).get('type', 'unknown')
+            desc = desc[:100]
+        else:
+            param_format = schema.get('format', '')
+            param_type = f"{schema.get('type', 'unknown')}{f'({param_format})' if param_format else ''}"
+        return f"{param['name']} ({param['in']}, {param_type}, {required}): {desc}"
+
+    def _flatten_request_content(self, content_type: str, content_info: Dict[str, Any], style: str) -> List[str]:
+        """扁平化请求体中的一种内容类型, 返回若干行, style 含义与 _flatten_operation 相同"""
+        if style == 'csv':
+            return [f"{content_type}({content_info.get('type', 'object')})"]
+
+        lines = [f"Content-Type: {content_type}"]
+        schema = content_info.get('schema', {})
+        if style == 'model':
+            schema_details = self._extract_schema_details(schema)
+            if schema_details.get('type') == 'object' and 'properties' in schema_details:
+                for prop_name, prop_info in schema_details['properties'].items():
+                    required = "必填" if prop_info.get('required', False) else "可选"
+                    lines.append(f"- {prop_name} ({prop_info.get('type', 'unknown')}, {required}): {prop_info.get('description', '')}")
+        else:
+            required_props = frozenset(schema.get('required', ()))
+            for prop_name, prop_details in schema.get('properties', {}).items():
+                required = "必填" if prop_name in required_props else "可选"
+                lines.append(f"- {prop_name} ({prop_details.get('type', 'unknown')}, {required}): {prop_details.get('description', '')}")
+        return lines
+
+    def _flatten_response(self, status_code: str, response: Dict[str, Any], style: str) -> List[str]:
+        """扁平化单个响应, 返回若干行, style 含义与 _flatten_operation 相同"""
+        resp_desc = response.get('description')
+        if style == 'csv':
+            return [f"{status_code}({resp_desc})"]
+
+        resp_desc = resp_desc or ""
+        lines = [f"状态码 {status_code}: {resp_desc[:100] if style == 'model' else resp_desc}"]
+        for content_type, content_info in response.get('content', {}).items():
+            lines.append(f"Content-Type: {content_type}")
+            schema = content_info.get('schema', {})
+            if style == 'model':
+                schema_details = self._extract_schema_details(schema)
+                if schema_details.get('type') == 'object' and 'properties' in schema_details:
+                    for prop_name, prop_info in schema_details['properties'].items():
+                        lines.append(f"- {prop_name} ({prop_info.get('type', 'unknown')}): {prop_info.get('description', '')}")
+            elif schema:
+                schema_type = schema.get('type', 'object')
+                lines.append(f"Schema类型: {schema_type}")
+                if schema_type == 'object' and 'properties' in schema:
+                    for prop_name, prop_details in schema['properties'].items():
+                        lines.append(f"- {prop_name} ({prop_details.get('type', 'unknown')}): {prop_details.get('description', '')}")
+        return lines
 
     def to_dataframe(self) -> pd.DataFrame:
         """
@@ -269,9 +383,11 @@ class OpenAPIParser:
         Returns:
             pd.DataFrame: 包含 API 信息的 DataFrame
         """
-        # 准备数据行
-        rows = []
-        paths = self.get_paths()
+        # 按列收集数据, 最后一次性构建 DataFrame, 避免逐行的字典推断列结构
+        columns = {
+            'path': [], 'method': [], 'full_url': [], 'summary': [], 'description': [],
+            'operationId': [], 'tags': [], 'parameters': [], 'request_body': [], 'responses': []
+        }
 
         # 获取全局信息
         api_title = self.get_info().get('title', '')
@@ -279,35 +395,36 @@ class OpenAPIParser:
         api_description = self.get_info().get('description', '')
 
         # 获取服务器信息
-        servers = self.get_servers()
-        server_urls = [server.get('url', '') for server in servers] if isinstance(servers, list) else []
-        base_url = server_urls[0] if server_urls else ''
+        base_url = self.get_base_url()
 
-        for path, operations in paths.items():
-            for method, operation in operations.items():
+        for path, operations in self._iter_raw_paths():
+            for method, operation in operations:
                 # 创建参数的详细信息
                 parameters_info = []
-                if operation.parameters:
-                    for param in operation.parameters:
-                        param_type = param.schema.get('type', 'unknown')
-                        param_format = param.schema.get('format', '')
+                parameters = operation.get('parameters')
+                if parameters:
+                    for param in parameters:
+                        param_schema = param.get('schema', {})
+                        param_type = param_schema.get('type', 'unknown')
+                        param_format = param_schema.get('format', '')
                         param_info = {
-                            'name': param.name,
-                            'in': param.in_,
-                            'required': param.required,
+                            'name': param['name'],
+                            'in': param['in'],
+                            'required': param.get('required', False),
                             'type': param_type,
                             'format': param_format,
-                            'description': param.description or ''
+                            'description': param.get('description') or ''
                         }
                         parameters_info.append(param_info)
 
                 # 请求体信息
                 request_body_info = {}
-                if operation.requestBody:
-                    for content_type, content_schema in operation.requestBody.content.items():
+                request_body = operation.get('requestBody')
+                if request_body:
+                    for content_type, content_schema in request_body['content'].items():
                         schema = content_schema.get('schema', {})
                         properties = schema.get('properties', {})
-                        required_props = schema.get('required', [])
+                        required_props = frozenset(schema.get('required', ()))
 
                         prop_details = {}
                         for prop_name, prop_details_raw in properties.items():
@@ -324,9 +441,9 @@ class OpenAPIParser:
 
                 # 响应信息
                 response_info = {}
-                for status_code, response in operation.responses.items():
+                for status_code, response in operation['responses'].items():
                     response_content = {}
-                    for content_type, content_schema in response.content.items():
+                    for content_type, content_schema in response.get('content', {}).items():
                         schema = content_schema.get('schema', {})
                         response_content[content_type] = {
                             'schema_type': schema.get('type', 'object'),
@@ -334,56 +451,86 @@ class OpenAPIParser:
                         }
 
                     response_info[status_code] = {
-                        'description': response.description or '',
+                        'description': response.get('description') or '',
                         'content': response_content
                     }
 
-                # 构建一行完整数据
-                row = {
-                    'api_title': api_title,
-                    'api_version': api_version,
-                    'api_description': api_description,
-                    'base_url': base_url,
-                    'path': path,
-                    'method': method.upper(),
-                    'full_url': f"{base_url}{path}",
-                    'summary': operation.summary or '',
-                    'description': operation.description or '',
-                    'operationId': operation.operationId or '',
-                    'tags': operation.tags or [],
-                    'parameters': parameters_info,
-                    'request_body': request_body_info,
-                    'responses': response_info
-                }
-                rows.append(row)
-
-        # 创建 DataFrame
-        return pd.DataFrame(rows)
+                # 追加一行完整数据
+                columns['path'].append(path)
+                columns['method'].append(method.upper())
+                columns['full_url'].append(f"{base_url}{path}")
+                columns['summary'].append(operation.get('summary') or '')
+                columns['description'].append(operation.get('description') or '')
+                columns['operationId'].append(operation.get('operationId') or '')
+                columns['tags'].append(operation.get('tags') or [])
+                columns['parameters'].append(parameters_info)
+                columns['request_body'].append(request_body_info)
+                columns['responses'].append(response_info)
+
+        # 创建 DataFrame, 全局信息列由标量广播到每一行
+        df = pd.DataFrame({
+            'api_title': api_title,
+            'api_version': api_version,
+            'api_description': api_description,
+            'base_url': base_url,
+            **columns
+        })
+        # 取值很少的列使用分类类型, 每个单元格只保存一个整数编码;
+        # 分类列的 == 'GET'、isin、.str 访问器、单元格取值 (仍为 str) 和 to_csv 输出与字符串列一致
+        return df.astype({
+            'api_title': 'category', 'api_version': 'category', 'api_description': 'category',
+            'base_url': 'category', 'method': 'category'
+        })
 
     def _extract_schema_details(self, schema):
-        """提取schema的详细信息但保持紧凑"""
+        """
+        提取schema的详细信息但保持紧凑
+
+        schema 是规范中的字典, 在解析器生命周期内不变, 因此结果按字典 id 缓存,
+        重复生成模型数据时不再重新提取。调用方不应修改返回的结果。
+        """
         if not schema:
             return {}
 
-        details = {}
+        key = id(schema)
+        details = self._schema_details.get(key)
+        if details is None:
+            details = self._schema_details[key] = self._build_schema_details(schema)
+        return details
+
+    def _build_schema_details(self, schema):
+        """提取schema的详细信息, 数组类型逐层展开 items 而不递归"""
+        array_depth = 0
+        while schema and schema.get('type', 'object') == 'array' and 'items' in schema:
+            array_depth += 1
+            schema = schema['items']
+
+        details = self._build_non_array_schema_details(schema) if schema else {}
+        for _ in range(array_depth):
+            details = {'type': 'array', 'items': details}
+        return details
+
+    @staticmethod
+    def _build_non_array_schema_details(schema):
+        """提取非数组类型 (或没有 items 的数组类型) schema 的详细信息"""
         schema_type = schema.get('type', 'object')
 
         # 对象类型
         if schema_type == 'object':
             properties = schema.get('properties', {})
-            required = schema.get('required', [])
+            required = frozenset(schema.get('required', ()))
 
             prop_details = {}
             for name, prop in properties.items():
                 # 简化属性信息，保留关键字段
                 is_required = name in required
                 prop_type = prop.get('type', 'unknown')
-                desc = prop.get('description', '')
+                desc = prop.get('description', '')[:50]  # 限制描述长度
 
                 # 递归处理嵌套对象，但限制深度
                 if prop_type == 'object' and 'properties' in prop:
                     nested_props = {}
-                    for nested_name, nested_prop in prop.get('properties', {}).items():
+                    for nested_name, nested_prop in prop['properties'].items():
                         nested_props[nested_name] = {
                             'type': nested_prop.get('type', 'unknown'),
                             'description': nested_prop.get('description', '')[:50]  # 限制描述长度
@@ -391,17 +538,16 @@ class OpenAPIParser:
                     prop_details[name] = {
                         'type': prop_type,
                         'required': is_required,
-                        'description': desc[:50],  # 限制描述长度
+                        'description': desc,
                         'properties': nested_props
                     }
                 # 处理数组类型
                 elif prop_type == 'array' and 'items' in prop:
-                    items = prop.get('items', {})
-                    items_type = items.get('type', 'unknown')
+                    items_type = prop['items'].get('type', 'unknown')
                     prop_details[name] = {
                         'type': f'array[{items_type}]',
                         'required': is_required,
-                        'description': desc[:50]  # 限制描述长度
+                        'description': desc
                     }
                 else:
                     # 基本类型
@@ -414,17 +560,11 @@ class OpenAPIParser:
                     prop_details[name] = {
                         'type': type_str,
                         'required': is_required,
-                        'description': desc[:50]  # 限制描述长度
+                        'description': desc
                     }
 
             return {'type': schema_type, 'properties': prop_details}
 
-        # 数组类型
-        elif schema_type == 'array' and 'items' in schema:
-            items = schema.get('items', {})
-            items_details = self._extract_schema_details(items)
-            return {'type': 'array', 'items': items_details}
-
         # 其他基本类型
         else:
             return {
@@ -433,114 +573,111 @@ class OpenAPIParser:
                 'enum': schema.get('enum', [])[:5]  # 最多保留5个枚举值
             }
 
-    def to_model_dataframe(self) -> pd.DataFrame:
+    def to_model_dataframe(self, path_filter=None, method_filter=None, max_endpoints=None) -> pd.DataFrame:
         """
         将 OpenAPI 文档转换为适合提供给模型使用的 pandas DataFrame，
         提供详细的请求参数和返回参数，但控制token使用量
 
+        过滤条件在生成数据时应用, 被过滤掉的端点不会生成行数据。
+
+        Args:
+            path_filter: 端点 (如 "GET /users") 的过滤条件，可以是字符串或正则表达式，字符串不区分大小写
+            method_filter: HTTP方法过滤条件，如'GET'、'POST'等
+            max_endpoints: 最大端点数量
+
         Returns:
             pd.DataFrame: 优化后的 API 信息 DataFrame
         """
-        # 准备数据
-        all_data = []
-        paths = self.get_paths()
+        api_info = self.get_info()
+        df = pd.DataFrame.from_records(
+            self._iter_model_values(path_filter, method_filter, max_endpoints), columns=_MODEL_COLUMNS
+        )
+        # 每一行都相同的列由标量广播, 并使用分类类型
+        df.insert(0, 'version', pd.Categorical([api_info.get('version', '')] * len(df)))
+        df.insert(0, 'api_name', pd.Categorical([api_info.get('title', '')] * len(df)))
+        return df
+
+    def iter_model_rows(self, path_filter=None, method_filter=None, max_endpoints=None) -> Iterator[Dict[str, str]]:
+        """
+        逐行生成与 to_model_dataframe 相同的数据, 参数含义与 to_model_dataframe 相同
 
-        # 获取API基本信息
+        适合逐个端点处理的调用方, 不构建 DataFrame, 也不在内存中保存所有端点的数据。
+
+        Yields:
+            dict: 列名 -> 值, 列与 to_model_dataframe 一致
+        """
         api_info = self.get_info()
         api_title = api_info.get('title', '')
         api_version = api_info.get('version', '')
+        for values in self._iter_model_values(path_filter, method_filter, max_endpoints):
+            yield {'api_name': api_title, 'version': api_version, **dict(zip(_MODEL_COLUMNS, values))}
+
+    def _iter_model_values(self, path_filter=None, method_filter=None, max_endpoints=None):
+        """按 _MODEL_COLUMNS 的顺序逐个生成每个端点的值元组, 参数含义与 to_model_dataframe 相同"""
+        if path_filter and not isinstance(path_filter, re.Pattern):
+            path_filter = re.compile(path_filter, re.IGNORECASE)
+        method_prefix = method_filter.upper() if method_filter else None
 
         # 获取服务器信息
-        servers = self.get_servers()
-        server_urls = [server.get('url', '') for server in servers] if isinstance(servers, list) else []
-        base_url = server_urls[0] if server_urls else ''
+        base_url = self.get_base_url()
 
         # 解析API路径
-        for path, operations in paths.items():
-            for method, operation in operations.items():
-                # 处理请求参数
-                parameters_list = []
-                if operation.parameters:
-                    for param in operation.parameters:
-                        schema_details = self._extract_schema_details(param.schema)
-                        required_mark = "必填" if param.required else "可选"
-                        param_desc = param.description or ""
-                        param_str = f"{param.name} ({param.in_}, {schema_details.get('type', 'unknown')}, {required_mark}): {param_desc[:100]}"
-                        parameters_list.append(param_str)
-
-                # 处理请求体
-                request_body_info = []
-                if operation.requestBody:
-                    for content_type, content_info in operation.requestBody.content.items():
-                        schema = content_info.get('schema', {})
-                        schema_details = self._extract_schema_details(schema)
-
-                        # 添加内容类型
-                        request_body_info.append(f"Content-Type: {content_type}")
-
-                        # 处理请求体属性
-                        if schema_details.get('type') == 'object' and 'properties' in schema_details:
-                            for prop_name, prop_info in schema_details['properties'].items():
-                                required_mark = "必填" if prop_info.get('required', False) else "可选"
-                                prop_desc = prop_info.get('description', '')
-                                prop_str = f"- {prop_name} ({prop_info.get('type', 'unknown')}, {required_mark}): {prop_desc}"
-                                request_body_info.append(prop_str)
-
-                # 处理响应信息
-                response_info = []
-                for status_code, response in operation.responses.items():
-                    resp_desc = response.description or ""
-                    response_info.append(f"状态码 {status_code}: {resp_desc[:100]}")
-
-                    # 处理响应内容
-                    for content_type, content_info in response.content.items():
-                        schema = content_info.get('schema', {})
-                        schema_details = self._extract_schema_details(schema)
-
-                        response_info.append(f"Content-Type: {content_type}")
-
-                        # 处理响应体属性
-                        if schema_details.get('type') == 'object' and 'properties' in schema_details:
-                            for prop_name, prop_info in schema_details['properties'].items():
-                                prop_desc = prop_info.get('description', '')
-                                prop_str = f"- {prop_name} ({prop_info.get('type', 'unknown')}): {prop_desc}"
-                                response_info.append(prop_str)
-
-                # 构建行数据
-                row_data = {
-                    'api_name': api_title,
-                    'version': api_version,
-                    'endpoint': f"{method.upper()} {path}",
-                    'full_url': f"{base_url}{path}",
-                    'summary': operation.summary or '',
-                    'description': operation.description or '',
-                    'tags': ', '.join(operation.tags or []),
-                    'parameters': '\n'.join(parameters_list),
-                    'request_body': '\n'.join(request_body_info),
-                    'responses': '\n'.join(response_info)
-                }
-                all_data.append(row_data)
-
-        return pd.DataFrame(all_data)
+        count = 0
+        for path, operations in self._iter_raw_paths():
+            for method, operation in operations:
+                if max_endpoints and count >= max_endpoints:
+                    return
+                endpoint = f"{method.upper()} {path}"
+                if method_prefix and not endpoint.startswith(method_prefix):
+                    continue
+                if path_filter and not path_filter.search(endpoint):
+                    continue
+
+                parameters, request_body, responses = self._flatten_operation(operation, 'model')
+
+                count += 1
+                yield (
+                    endpoint,
+                    f"{base_url}{path}",
+                    operation.get('summary') or '',
+                    operation.get('description') or '',
+                    ', '.join(operation.get('tags') or []),
+                    parameters,
+                    request_body,
+                    responses
+                )
 
-    def save_model_dataframe(self, output_path: str, format: str = 'csv'):
+    def save_model_dataframe(self, output_path: str, format: str = 'csv', df: pd.DataFrame = None):
         """
         保存模型友好的DataFrame到文件
 
         Args:
             output_path: 输出文件路径
-            format: 输出格式，支持 'csv', 'excel', 'json'
+            format: 输出格式，支持 'csv', 'excel', 'json', 'feather', 'parquet'
+                (feather 和 parquet 需要安装 pyarrow, 读写速度快且文件更小)
+            df: 已生成的 to_model_dataframe 结果, 保存多种格式时可以复用, 为 None 时重新生成
         """
-        df = self.to_model_dataframe()
-
-        if format.lower() == 'csv':
-            df.to_csv(output_path, index=False, encoding='utf-8')
-        elif format.lower() == 'excel':
+        if df is None:
+            df = self.to_model_dataframe()
+        format = format.lower()
+
+        if format == 'csv':
+            with open(output_path, 'w', newline='', encoding='utf-8', buffering=_WRITE_BUFFER_SIZE) as f:
+                df.to_csv(f, index=False)
+        elif format == 'excel':
             df.to_excel(output_path, index=False)
-        elif format.lower() == 'json':
-            df.to_json(output_path, orient='records', force_ascii=False, indent=2)
+        elif format == 'json':
+            # 所有列都是字符串, 直接序列化记录列表, 比 DataFrame.to_json 快且不转义 "/"
+            with open(output_path, 'wb') as f:
+                f.write(dumps(df.to_dict(orient='records'), indent=True))
+        elif format == 'feather':
+            df.to_feather(output_path, compression='zstd')
+        elif format == 'parquet':
+            df.to_parquet(output_path, compression='zstd', index=False)
         else:
-            raise ValueError(f"不支持的输出格式: {format}，请使用 'csv', 'excel' 或 'json'")
+            raise ValueError(
+                f"不支持的输出格式: {format}，请使用 'csv', 'excel', 'json', 'feather' 或 'parquet'"
+            )
 
     def get_api_context_for_model(self, path_filter=None, method_filter=None, max_endpoints=None) -> str:
         """
@@ -554,47 +691,36 @@ class OpenAPIParser:
         Returns:
             str: 格式化的API上下文描述
         """
-        df = self.to_model_dataframe()
-
-        # 应用过滤器
-        if path_filter:
-            df = df[df['endpoint'].str.contains(path_filter, case=False)]
-
-        if method_filter:
-            method_upper = method_filter.upper()
-            df = df[df['endpoint'].str.startswith(method_upper)]
-
-        # 限制端点数量
-        if max_endpoints and len(df) > max_endpoints:
-            df = df.head(max_endpoints)
+        api_info = self.get_info()
 
-        # 构建上下文文本
+        # 构建上下文文本, 逐个端点生成, 不构建 DataFrame
         context_lines = [
-            f"# {df['api_name'].iloc[0]} API (版本: {df['version'].iloc[0]})",
+            f"# {api_info.get('title', '')} API (版本: {api_info.get('version', '')})",
             "\n## 可用端点\n"
         ]
 
-        for _, row in df.iterrows():
-            context_lines.append(f"### {row['endpoint']}")
-            if row['summary']:
-                context_lines.append(f"**概要**: {row['summary']}")
-            if row['description']:
-                context_lines.append(f"**描述**: {row['description']}")
+        for endpoint, _, summary, description, _, parameters, request_body, responses in self._iter_model_values(
+                path_filter, method_filter, max_endpoints):
+            context_lines.append(f"### {endpoint}")
+            if summary:
+                context_lines.append(f"**概要**: {summary}")
+            if description:
+                context_lines.append(f"**描述**: {description}")
 
             # 参数信息
-            if row['parameters']:
+            if parameters:
                 context_lines.append("\n**参数**:")
-                context_lines.append(row['parameters'])
+                context_lines.append(parameters)
 
             # 请求体信息
-            if row['request_body']:
+            if request_body:
                 context_lines.append("\n**请求体**:")
-                context_lines.append(row['request_body'])
+                context_lines.append(request_body)
 
             # 响应信息
-            if row['responses']:
+            if responses:
                 context_lines.append("\n**响应**:")
-                context_lines.append(row['responses'])
+                context_lines.append(responses)
 
             context_lines.append("\n---\n")  # 端点分隔符
 
@@ -609,7 +735,17 @@ class OpenAPIParser:
         Yields:
             pd.DataFrame: 每个API路径及其关联操作的DataFrame，包含扁平化的信息
         """
-        paths = self.get_paths()
+        for rows in self.iter_api_details_records():
+            yield pd.DataFrame(rows)
+
+    def iter_api_details_records(self):
+        """
+        与 iter_api_details_by_path 相同, 但每个路径输出字典列表而不构建 DataFrame
+
+        Yields:
+            List[dict]: 每个路径的操作, 每个操作一个字典, 键与 iter_api_details_by_path 的列相同;
+                没有操作的路径输出空列表
+        """
 
         # 获取全局信息
         api_title = self.get_info().get('title', '')
@@ -617,69 +753,12 @@ class OpenAPIParser:
         api_description = self.get_info().get('description', '')
 
         # 获取服务器信息
-        servers = self.get_servers()
-        server_urls = [server.get('url', '') for server in servers] if isinstance(servers, list) else []
-        base_url = server_urls[0] if server_urls else ''
+        base_url = self.get_base_url()
 
-        for path, operations in paths.items():
+        for path, operations in self._iter_raw_paths():
             rows = []
-            for method, operation in operations.items():
-                # 扁平化参数信息为字符串
-                parameters_str = ""
-                if operation.parameters:
-                    param_items = []
-                    for param in operation.parameters:
-                        required = "必填" if param.required else "可选"
-                        param_type = param.schema.get('type', 'unknown')
-                        param_format = param.schema.get('format', '')
-                        type_str = f"{param_type}{f'({param_format})' if param_format else ''}"
-                        desc = param.description or ""
-                        param_items.append(f"{param.name} ({param.in_}, {type_str}, {required}): {desc}")
-                    parameters_str = "\n".join(param_items)
-
-                # 扁平化请求体为字符串
-                request_body_str = ""
-                if operation.requestBody:
-                    req_body_items = []
-                    for content_type, content_schema in operation.requestBody.content.items():
-                        req_body_items.append(f"Content-Type: {content_type}")
-
-                        schema = content_schema.get('schema', {})
-                        properties = schema.get('properties', {})
-                        required_props = schema.get('required', [])
-
-                        for prop_name, prop_details in properties.items():
-                            required = "必填" if prop_name in required_props else "可选"
-                            prop_type = prop_details.get('type', 'unknown')
-                            prop_desc = prop_details.get('description', '')
-                            req_body_items.append(f"- {prop_name} ({prop_type}, {required}): {prop_desc}")
-
-                    request_body_str = "\n".join(req_body_items)
-
-                # 扁平化响应信息为字符串
-                response_str = ""
-                if operation.responses:
-                    resp_items = []
-                    for status_code, response in operation.responses.items():
-                        resp_desc = response.description or ""
-                        resp_items.append(f"状态码 {status_code}: {resp_desc}")
-
-                        for content_type, content_schema in response.content.items():
-                            resp_items.append(f"Content-Type: {content_type}")
-
-                            schema = content_schema.get('schema', {})
-                            if schema:
-                                schema_type = schema.get('type', 'object')
-                                resp_items.append(f"Schema类型: {schema_type}")
-
-                                # 处理对象类型的schema
-                                if schema_type == 'object' and 'properties' in schema:
-                                    for prop_name, prop_details in schema.get('properties', {}).items():
-                                        prop_type = prop_details.get('type', 'unknown')
-                                        prop_desc = prop_details.get('description', '')
-                                        resp_items.append(f"- {prop_name} ({prop_type}): {prop_desc}")
-
-                    response_str = "\n".join(resp_items)
+            for method, operation in operations:
+                parameters_str, request_body_str, response_str = self._flatten_operation(operation, 'details')
 
                 # 构建一行完整数据，使用扁平化的字符串
                 row = {
@@ -690,16 +769,16 @@ class OpenAPIParser:
                     'path': path,
                     'method': method.upper(),
                     'full_url': f"{base_url}{path}",
-                    'summary': operation.summary or '',
-                    'description': operation.description or '',
-                    'operationId': operation.operationId or '',
-                    'tags': ', '.join(operation.tags or []),  # 将列表转换为逗号分隔的字符串
+                    'summary': operation.get('summary') or '',
+                    'description': operation.get('description') or '',
+                    'operationId': operation.get('operationId') or '',
+                    'tags': ', '.join(operation.get('tags') or []),  # 将列表转换为逗号分隔的字符串
                     'parameters': parameters_str,  # 扁平化的参数字符串
                     'request_body': request_body_str,  # 扁平化的请求体字符串
                     'responses': response_str  # 扁平化的响应字符串
                 }
                 rows.append(row)
-            yield pd.DataFrame(rows)
+            yield rows
 
 
 if __name__ == '__main__':
@@ -721,18 +800,18 @@ if __name__ == '__main__':
     print(info)
     print(server)
 
-    # 保存为模型友好的DataFrame
-    parser.save_model_dataframe('res/api_for_model.csv')
-    parser.save_model_dataframe('res/api_for_model.xlsx', format='excel')
-    parser.save_model_dataframe('res/api_for_model.json', format='json')
+    # 生成一次模型友好的DataFrame, 保存为多种格式时复用
+    df = parser.to_model_dataframe()
+    parser.save_model_dataframe('res/api_for_model.csv', df=df)
+    parser.save_model_dataframe('res/api_for_model.xlsx', format='excel', df=df)
+    parser.save_model_dataframe('res/api_for_model.json', format='json', df=df)
 
     # 获取适合模型使用的API上下文
     api_context = parser.get_api_context_for_model(max_endpoints=10)
     with open('res/api_context.md', 'w', encoding='utf-8') as f:
         f.write(api_context)
 
-    # 获取DataFrame用于自定义处理
-    df = parser.to_model_dataframe()
+    # DataFrame 也可用于自定义处理
     print(f"成功生成API DataFrame，共 {len(df)} 个端点")
 
     # 生成并保存压缩后的规范
@@ -742,7 +821,7 @@ if __name__ == '__main__':
     parser.to_csv('res/api.csv')
 
     # 保存到文件
-    parser.save_compressed_spec('res/compressed_spec.json')
+    parser.save_compressed_spec('res/compressed_spec.json', compressed_spec)
 
     print(df)
 
@@ -1,12 +1,62 @@
-from typing import Dict, List, Optional
+import copy
+import functools
+import os
+import string
+from typing import Dict, List, Optional, Tuple
 import yaml
 
+# 安装了 libyaml 时使用其 C 实现解析和输出, 安全语义与 SafeLoader/SafeDumper 相同
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+@functools.lru_cache(maxsize=32)
+def _load_yaml_cached(abspath: str, mtime_ns: int) -> dict:
+    """
+    解析 YAML 文件, 按 (绝对路径, 修改时间) 缓存, 文件被修改后自动重新解析
+
+    返回的对象在实例间共享, 调用方需要复制后再使用。
+    """
+    # 以二进制读取, 由 libyaml 直接解码 UTF-8 字节 (并识别 BOM), 不经过文本模式的解码和换行转换
+    with open(abspath, 'rb') as f:
+        return yaml.load(f, Loader=_YAML_LOADER)
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_template(template: str) -> Optional[Tuple[Tuple[str, Optional[str]], ...]]:
+    """
+    预先解析模板, 返回 (文本, 字段名) 片段序列, 渲染时不再扫描模板字符串
+
+    模板中有格式说明、转换标记、位置参数或属性/下标访问时返回 None, 由 str.format 处理。
+    """
+    parts = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(template):
+        if field_name is not None and (format_spec or conversion or not field_name.isidentifier()):
+            return None
+        parts.append((literal, field_name))
+    return tuple(parts)
+
+
+def _format_template(template: str, kwargs: dict) -> str:
+    """与 template.format(**kwargs) 结果相同, 缺少字段时同样抛出 KeyError"""
+    parts = _compile_template(template)
+    if parts is None:
+        return template.format(**kwargs)
+    pieces = []
+    for literal, field_name in parts:
+        pieces.append(literal)
+        if field_name is not None:
+            pieces.append(format(kwargs[field_name], ''))
+    return ''.join(pieces)
+
 
 class AgentTemplateManager:
     """
     一个用于管理和解析来自 YAML 配置的代理模板的类。
     """
 
+    __slots__ = ('config', 'steps', 'tools', 'history_processors', '_steps_by_number')
+
     def __init__(self, config_path: Optional[str] = None, config_dict: Optional[dict] = None):
         """
         从 YAML 文件路径或字典初始化模板管理器。
@@ -19,8 +69,9 @@ class AgentTemplateManager:
             raise ValueError("请仅提供 config_path 或 config_dict，不要同时提供两者")
 
         if config_path:
-            with open(config_path, 'r') as f:
-                self.config = yaml.safe_load(f)
+            abspath = os.path.abspath(config_path)
+            # to_dict 和各 get_* 方法返回配置内部的对象, 复制一份避免调用方修改缓存
+            self.config = copy.deepcopy(_load_yaml_cached(abspath, os.stat(abspath).st_mtime_ns))
         elif config_dict:
             self.config = config_dict
         else:
@@ -30,6 +81,12 @@ class AgentTemplateManager:
         self.tools = self.config.get('tools', {})
         self.history_processors = self.config.get('history_processors', [])
 
+        # 步骤编号 -> 步骤, 编号重复时与原先的顺序查找一致, 取第一个
+        self._steps_by_number: Dict[int, Dict] = {}
+        for step in self.steps:
+            if step.get('step') is not None:
+                self._steps_by_number.setdefault(step['step'], step)
+
     def get_step(self, step_number: int) -> Optional[Dict]:
         """从配置中获取特定的步骤。
 
@@ -39,10 +96,7 @@ class AgentTemplateManager:
         返回:
             步骤字典，如果找到；否则返回 None。
         """
-        for step in self.steps:
-            if step.get('step') == step_number:
-                return step
-        return None
+        return self._steps_by_number.get(step_number)
 
     def get_system_template(self, step_number: int) -> Optional[str]:
         """获取特定步骤的系统模板。
@@ -69,11 +123,11 @@ class AgentTemplateManager:
         返回:
             格式化后的实例模板字符串，如果找到；否则返回 None。
         """
-        step = self.get_step(step_number)
+        step = self._steps_by_number.get(step_number)
         if step and step.get('templates'):
             template = step['templates'].get('instance_template', '')
             try:
-                return template.format(**kwargs)
+                return _format_template(template, kwargs)
             except KeyError as e:
                 print(f"在格式化步骤 {step_number} 的模板时发生 KeyError：{e}")
                 return None
@@ -139,7 +193,7 @@ class AgentTemplateManager:
             path: 要保存 YAML 文件的路径。
         """
         with open(path, 'w') as f:
-            yaml.dump(self.config, f)
+            yaml.dump(self.config, f, Dumper=_YAML_DUMPER)
 
     def get_all_step_numbers(self) -> List[int]:
         """获取所有步骤编号的列表。"""
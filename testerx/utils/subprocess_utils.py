@@ -0,0 +1,56 @@
+import asyncio
+import subprocess
+from typing import List, Tuple
+
+
+async def run_subprocess(args: List[str], timeout: float) -> Tuple[int, str, str]:
+    """
+    异步执行子进程并收集输出, 等待期间不占用线程, 多个命令可以在同一个事件循环中并发执行
+
+    Args:
+        args: 命令及其参数
+        timeout: 超时时间 (秒)
+
+    Returns:
+        (退出码, 标准输出, 标准错误) 元组
+
+    Raises:
+        subprocess.TimeoutExpired: 超时 (子进程已被终止), 与 subprocess.run 的行为一致
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise subprocess.TimeoutExpired(args, timeout)
+    return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+
+def run_subprocess_blocking(args: List[str], timeout: float) -> Tuple[int, str, str]:
+    """
+    同步执行子进程并收集输出, 返回值与 run_subprocess 相同
+
+    以 bytes 读取两个管道 (POSIX 上由 communicate 通过 selectors 和 os.read 读取),
+    结束后只解码一次, 不对每个数据块做文本解码和换行符转换。
+
+    Args:
+        args: 命令及其参数
+        timeout: 超时时间 (秒)
+
+    Returns:
+        (退出码, 标准输出, 标准错误) 元组
+
+    Raises:
+        subprocess.TimeoutExpired: 超时 (子进程已被终止)
+    """
+    with subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+    return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
@@ -0,0 +1,24 @@
+import time
+from datetime import datetime
+
+# (整秒时间戳, 对应的 "YYYY-MM-DDTHH:MM:SS" 前缀), 整体替换以保证多线程读取时的一致性
+_second_prefix = (None, "")
+
+
+def iso_now() -> str:
+    """
+    返回当前本地时间的 ISO 8601 字符串, 精确到微秒
+
+    同一秒内的多次调用复用已格式化的日期时间前缀, 只拼接微秒部分,
+    避免每条日志都调用 datetime.now().isoformat()。
+
+    Returns:
+        形如 "2024-01-01T12:00:00.123456" 的时间字符串
+    """
+    global _second_prefix
+    seconds, nanoseconds = divmod(time.time_ns(), 1_000_000_000)
+    cached_seconds, prefix = _second_prefix
+    if seconds != cached_seconds:
+        prefix = datetime.fromtimestamp(seconds).strftime("%Y-%m-%dT%H:%M:%S")
+        _second_prefix = (seconds, prefix)
+    return f"{prefix}.{nanoseconds // 1000:06d}"
@@ -1,70 +1,90 @@
 from testerx.utils.parsing_openapi_json import OpenAPIParser
 from testerx.data_access.json_data_access import JsonDataAccess
 from testerx.utils.dataframe_exporter import DataFrameToStringConverter
-import pandas as pd
 import config
+import functools
+import hashlib
 import os
+from typing import List
 
+# 写入 API 文档记忆 metadata 的字段
+_METADATA_FIELDS = ('api_title', 'api_version', 'api_description', 'base_url', 'full_url', 'operationId')
 
-def add_openapi_documents_to_memory(spec_path: str):  # 移除 memory_data_dir 参数
+
+def _str_or_none(value):
+    """缺失值 (None 或 NaN) 返回 None, 其余值转换为字符串"""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value)
+
+
+@functools.lru_cache(maxsize=64)
+def _get_api_doc_data_access(memory_data_dir: str) -> JsonDataAccess:
+    """
+    按目录复用 JsonDataAccess 实例
+
+    同一进程内多次导入同一项目的文档时, 不再重复加载记忆索引、标签和 Faiss 索引。
+    """
+    return JsonDataAccess(memory_data_dir)
+
+
+def _content_digest(content: str) -> bytes:
+    """API 文档内容的摘要, 用于跳过内容相同的记忆"""
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+
+
+def add_openapi_documents_to_memory(spec_path: str, converter: DataFrameToStringConverter = None):  # 移除 memory_data_dir 参数
     """
     解析 OpenAPI 规范文件并将 API 文档信息添加到 JsonDataAccess 内存中。
 
     Args:
         spec_path: OpenAPI 规范文件路径
+        converter: 生成记忆内容的转换器, 为 None 时使用默认参数创建
     """
     parser = OpenAPIParser(spec_path=spec_path)
-    api_details_iterator = parser.iter_api_details_by_path()
-    converter = DataFrameToStringConverter()
+    # 每个路径的详细信息只用于生成文本和读取字段, 直接使用字典列表, 不构建 DataFrame
+    api_details_iterator = parser.iter_api_details_records()
+    if converter is None:
+        converter = DataFrameToStringConverter()
     project_name = parser.get_info()["title"]
     # 构建新的 memory_data_dir 路径
     memory_data_dir = os.path.join(config.PROJECT_PATH, project_name, "api_doc_memory_data")
-    data_access_api_doc = JsonDataAccess(memory_data_dir)  # 使用新的路径
-
-    for item in api_details_iterator:
-        content_string = converter.convert_to_string(item)
-
-        # 提取 API 文档的关键信息, 确保处理 DataFrame 并转换为字符串
-        api_path = str(item.iloc[0]['path']) if 'path' in item.columns and pd.notna(
-            item.iloc[0]['path']
-        ) else None  # 使用 item.iloc[0]['path']
-        method = str(item.iloc[0]['method']) if 'method' in item.columns and pd.notna(
-            item.iloc[0]['method']
-        ) else None  # 使用 item.iloc[0]['method']
-        summary = str(item.iloc[0]['summary']) if 'summary' in item.columns and pd.notna(
-            item.iloc[0]['summary']
-        ) else None  # 使用 item.iloc[0]['summary']
-        description = str(item.iloc[0]['description']) if 'description' in item.columns and pd.notna(
-            item.iloc[0]['description']
-        ) else None  # 使用 item.iloc[0]['description']
-
-        # 创建 metadata 作为标准 Python 字典, 确保值为字符串
-        metadata = {
-            'api_title': str(item.iloc[0]['api_title']) if 'api_title' in item.columns and pd.notna(
-                item.iloc[0]['api_title']
-            ) else None,  # 使用 item.iloc[0]['api_title']
-            'api_version': str(item.iloc[0]['api_version']) if 'api_version' in item.columns and pd.notna(
-                item.iloc[0]['api_version']
-            ) else None,  # 使用 item.iloc[0]['api_version']
-            'api_description': str(item.iloc[0]['api_description']) if 'api_description' in item.columns and pd.notna(
-                item.iloc[0]['api_description']
-            ) else None,  # 使用 item.iloc[0]['api_description']
-            'base_url': str(item.iloc[0]['base_url']) if 'base_url' in item.columns and pd.notna(
-                item.iloc[0]['base_url']
-            ) else None,  # 使用 item.iloc[0]['base_url']
-            'full_url': str(item.iloc[0]['full_url']) if 'full_url' in item.columns and pd.notna(
-                item.iloc[0]['full_url']
-            ) else None,  # 使用 item.iloc[0]['full_url']
-            'operationId': str(item.iloc[0]['operationId']) if 'operationId' in item.columns and pd.notna(
-                item.iloc[0]['operationId']
-            ) else None,  # 使用 item.iloc[0]['operationId']
-            # ... 其他 metadata 字段也需要类似处理
-        }
-        metadata = {k: v for k, v in metadata.items() if v is not None}
-
-        # 添加 API 文档记忆
-        try:
-            memory = data_access_api_doc.add_api_doc_memory(
+    data_access_api_doc = _get_api_doc_data_access(memory_data_dir)  # 使用新的路径
+
+    # 已存在的 API 文档内容摘要, 重复导入同一文档时跳过内容相同的路径, 不再写入和计算 embedding
+    seen_digests = {
+        _content_digest(memory['content'])
+        for memory in data_access_api_doc.get_all_memories_by_type('api_doc')
+    }
+    skipped = 0
+
+    # 先收集所有 API 文档记忆, 最后一次性批量添加 (embedding 合并为批量请求)
+    api_doc_specs = []
+    for rows in api_details_iterator:
+        content_string = converter.convert_records_to_string(rows)
+        digest = _content_digest(content_string)
+        if digest in seen_digests:
+            skipped += 1
+            continue
+        seen_digests.add(digest)
+
+        # 提取 API 文档的关键信息 (没有操作的路径得到空列表)
+        row = rows[0] if rows else {}
+        api_path = _str_or_none(row.get('path'))
+        method = _str_or_none(row.get('method'))
+        summary = _str_or_none(row.get('summary'))
+        description = _str_or_none(row.get('description'))
+
+        # 创建 metadata 作为标准 Python 字典, 确保值为字符串, 省略缺失的字段
+        metadata = {}
+        for key in _METADATA_FIELDS:
+            value = _str_or_none(row.get(key))
+            if value is not None:
+                metadata[key] = value
+
+        # 收集 API 文档记忆 (api_doc_memory_spec 只组装参数字典, 参数有误时在第一个路径就会抛出异常)
+        api_doc_specs.append(
+            JsonDataAccess.api_doc_memory_spec(
                 content=content_string,
                 api_path=api_path,
                 method=method,
@@ -73,13 +93,32 @@ def add_openapi_documents_to_memory(spec_path: str):  # 移除 memory_data_dir 
                 metadata=metadata,
                 tags=["openapi", "api_doc"]
             )
-            print(f"已添加API文档记忆: {api_path} - {method}, Memory ID: {memory['id']}")
-        except TypeError as e:
-            print(f"添加API文档记忆出错: {api_path} - {method}")
-            print(f"错误信息: {e}")
-            import traceback
-            traceback.print_exc()
+        )
+
+    # 批量添加 API 文档记忆, 进度信息拼接后一次输出, 不为每条记忆单独写一次标准输出
+    added_lines = [
+        f"已添加API文档记忆: {memory['metadata']['api_path']} - {memory['metadata']['method']}, "
+        f"Memory ID: {memory['id']}"
+        for memory in data_access_api_doc.add_memories_bulk(api_doc_specs)
+    ]
+    if added_lines:
+        print("\n".join(added_lines))
+    if skipped:
+        print(f"跳过内容未变化的API文档记忆: {skipped} 条")
+
+    return True
 
+
+def add_openapi_documents_to_memory_batch(spec_paths: List[str]):
+    """
+    依次导入多个 OpenAPI 规范文件, 所有文件共用一个转换器, 同一项目的文件共用一个 JsonDataAccess
+
+    Args:
+        spec_paths: OpenAPI 规范文件路径列表
+    """
+    converter = DataFrameToStringConverter()
+    for spec_path in spec_paths:
+        add_openapi_documents_to_memory(spec_path, converter=converter)
     return True
 
 